@@ -0,0 +1,276 @@
+"""
+Benchmarks for the telemetry hot paths.
+
+    python benchmarks.py                      # all suites, table output
+    python benchmarks.py parse paint --json results.json
+    python benchmarks.py --compare baseline.json
+
+Suites:
+    parse    packets/s through SerialProcessor.parse_data and
+             check_windows_serial.parse_data
+    latency  bytes written to a pty -> DataDisplay.update_values
+    paint    VerticalGauge / TiltGauge paintEvent under offscreen Qt
+    map      MapLoader page render and cache-file check
+    bulk     bulk_parser.parse_buffer on recorded dumps vs a parse_frame loop
+
+Timings are reported as p50/p90/p99/max in microseconds; the JSON output
+carries the same numbers so runs from different versions can be diffed.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication
+
+import bulk_parser
+import check_windows_serial
+from functions import (SerialProcessor, DataDisplay, DisplayUpdater,
+                       VerticalGauge, TiltGauge, MapLoader)
+from telemetry_schema import parse_frame
+from serial_sim import SimulatedLink, synthetic_frames
+
+PERCENTILES = (50, 90, 99)
+
+
+def summarize(samples_us):
+    """Percentile summary of a list of timings in microseconds"""
+    samples = np.asarray(samples_us, dtype=float)
+    result = {f"p{p}": float(np.percentile(samples, p)) for p in PERCENTILES}
+    result['max'] = float(samples.max())
+    result['mean'] = float(samples.mean())
+    result['samples'] = int(samples.size)
+    return result
+
+
+def sample_lines(count):
+    return [frame.decode('ascii').strip()
+            for _, frame in synthetic_frames(50, count)]
+
+
+def time_batches(func, items, batch=100):
+    """Per-item cost in microseconds, measured over batches to hide timer overhead"""
+    samples = []
+    for start in range(0, len(items) - batch + 1, batch):
+        chunk = items[start:start + batch]
+        t0 = time.perf_counter()
+        for item in chunk:
+            func(item)
+        samples.append((time.perf_counter() - t0) / batch * 1e6)
+    return samples
+
+
+def bench_parse(args):
+    lines = sample_lines(args.packets)
+    processor = SerialProcessor()
+    results = {}
+    for name, func in (('SerialProcessor.parse_data', processor.parse_data),
+                       ('check_windows_serial.parse_data', check_windows_serial.parse_data)):
+        func(lines[0])  # Warm up
+        t0 = time.perf_counter()
+        samples = time_batches(func, lines)
+        elapsed = time.perf_counter() - t0
+        result = summarize(samples)
+        result['packets_per_s'] = len(samples) * 100 / elapsed
+        results[name] = result
+    return results
+
+
+def bench_latency(args):
+    """End-to-end latency at args.rate packets/s, per-packet signal vs coalesced"""
+    app = QApplication.instance()
+    results = {}
+    for mode in ('signal', 'coalesced'):
+        link = SimulatedLink(iter(()), speed=0)
+        link.open()
+        processor = SerialProcessor(link.port)
+        display = DataDisplay()
+        updater = DisplayUpdater(display, args.refresh_hz)
+        sent = {}
+        latencies = []
+
+        original_update = display.update_values
+
+        def update_values(values, original_update=original_update, latencies=latencies, sent=sent):
+            # Sequence number rides in the first field
+            t_sent = sent.pop(values[0], None)
+            original_update(values)
+            if t_sent is not None:
+                latencies.append((time.perf_counter() - t_sent) * 1e6)
+        display.update_values = update_values
+
+        if mode == 'signal':
+            processor.data_processed.connect(display.update_values)
+        else:
+            processor.sample_sink = updater.submit
+            updater.start()
+
+        reader = threading.Thread(target=processor.run, daemon=True)
+        reader.start()
+
+        def write_frames(link=link, sent=sent):
+            time.sleep(0.3)  # Let the reader open the port
+            interval = 1.0 / args.rate
+            for seq in range(args.latency_packets):
+                sent[seq] = time.perf_counter()
+                link.send(f"${seq},5,10,12.60,F\n".encode('ascii'))
+                time.sleep(interval)
+            time.sleep(0.3)
+            QTimer.singleShot(0, app.quit)
+
+        writer = threading.Thread(target=write_frames, daemon=True)
+        writer.start()
+        app.exec_()
+        writer.join()
+        processor.stop()
+        updater.stop()
+        reader.join(timeout=1)
+        link.stop()
+
+        result = summarize(latencies) if latencies else {'samples': 0}
+        result['delivered'] = len(latencies)
+        results[f"bytes->update_values ({mode})"] = result
+    return results
+
+
+def bench_paint(args):
+    results = {}
+    height = VerticalGauge("HEIGHT", 0, 30, "m")
+    tilt = TiltGauge()
+    for name, widget, setter, span in (
+            ('VerticalGauge.paintEvent', height, height.set_value, 30),
+            ('TiltGauge.paintEvent', tilt, tilt.set_angle, 90)):
+        widget.show()
+        QApplication.processEvents()
+        samples = []
+        for frame in range(args.frames):
+            setter((frame % span) - (45 if widget is tilt else 0))
+            t0 = time.perf_counter()
+            widget.repaint()  # Synchronous paintEvent
+            samples.append((time.perf_counter() - t0) * 1e6)
+        widget.hide()
+        results[name] = summarize(samples)
+    return results
+
+
+def bench_map(args):
+    samples = {'MapLoader.html': [], 'MapLoader.run (write)': [],
+               'MapLoader.run (cached)': []}
+    with tempfile.TemporaryDirectory() as workdir:
+        cache_path = os.path.join(workdir, 'map.html')
+        for _ in range(args.map_runs):
+            t0 = time.perf_counter()
+            loader = MapLoader(cache_path=cache_path)
+            loader.html()
+            samples['MapLoader.html'].append((time.perf_counter() - t0) * 1e6)
+            for name in ('MapLoader.run (write)', 'MapLoader.run (cached)'):
+                if name.endswith('(write)') and os.path.exists(cache_path):
+                    os.remove(cache_path)
+                t0 = time.perf_counter()
+                loader.run()  # Emits map_ready before returning
+                samples[name].append((time.perf_counter() - t0) * 1e6)
+    return {name: summarize(values) for name, values in samples.items()}
+
+
+def bench_bulk(args):
+    """Per-packet cost of parsing a dump in chunks of args.bulk_chunk lines"""
+    frames = [frame for _, frame in synthetic_frames(50, args.packets)]
+    chunks = [b''.join(frames[start:start + args.bulk_chunk])
+              for start in range(0, len(frames), args.bulk_chunk)]
+
+    def per_line(data):
+        for line in data.splitlines():
+            parse_frame(line.decode('ascii').strip())
+
+    results = {}
+    for name, func in (('parse_frame loop', per_line),
+                       ('bulk_parser.parse_buffer', bulk_parser.parse_buffer)):
+        samples = []
+        t0 = time.perf_counter()
+        for chunk in chunks:
+            start = time.perf_counter()
+            func(chunk)
+            samples.append((time.perf_counter() - start) / args.bulk_chunk * 1e6)
+        elapsed = time.perf_counter() - t0
+        result = summarize(samples)
+        result['packets_per_s'] = len(frames) / elapsed
+        results[name] = result
+    return results
+
+
+SUITES = {
+    'parse': bench_parse,
+    'latency': bench_latency,
+    'paint': bench_paint,
+    'map': bench_map,
+    'bulk': bench_bulk,
+}
+
+
+def print_results(results, baseline=None):
+    for suite, benches in results['suites'].items():
+        print(f"\n[{suite}]")
+        for name, stats in benches.items():
+            line = f"  {name:<42}"
+            if 'p50' in stats:
+                line += (f" p50 {stats['p50']:9.1f}  p90 {stats['p90']:9.1f}"
+                         f"  p99 {stats['p99']:9.1f}  max {stats['max']:9.1f} us")
+            if 'packets_per_s' in stats:
+                line += f"  {stats['packets_per_s']:,.0f} pkt/s"
+            if baseline:
+                old = baseline.get('suites', {}).get(suite, {}).get(name)
+                if old and 'p50' in old and 'p50' in stats and old['p50']:
+                    line += f"  ({stats['p50'] / old['p50']:.2f}x baseline p50)"
+            print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Telemetry hot path benchmarks")
+    parser.add_argument('suites', nargs='*', metavar='SUITE',
+                        help=f"suites to run: {', '.join(SUITES)} (default: all)")
+    parser.add_argument('--json', metavar='PATH', help="write results as JSON")
+    parser.add_argument('--compare', metavar='PATH', help="baseline JSON to compare against")
+    parser.add_argument('--packets', type=int, default=100000, help="packets for the parse suite")
+    parser.add_argument('--latency-packets', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=200, help="packets/s for the latency suite")
+    parser.add_argument('--refresh-hz', type=float, default=30, help="coalesced display rate")
+    parser.add_argument('--frames', type=int, default=2000, help="repaints per gauge")
+    parser.add_argument('--map-runs', type=int, default=20)
+    parser.add_argument('--bulk-chunk', type=int, default=10000, help="lines per bulk parse call")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.suites if name not in SUITES]
+    if unknown:
+        parser.error(f"unknown suite: {', '.join(unknown)}")
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'suites': {},
+    }
+    for name in args.suites or SUITES:
+        results['suites'][name] = SUITES[name](args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Compact binary telemetry framing, the alternative to the ASCII
+"$height,speed,tilt,value,status" lines.
+
+Frame layout (little endian, 18 bytes with the current schema):
+    sync        2 bytes   0xAA 0x55
+    length      1 byte    payload size, always PAYLOAD.size
+    sequence    2 bytes   wraps at 65536, gaps are counted as drops
+    payload    11 bytes   telemetry_schema fields: int16 ints, float32
+                          floats, one byte per char
+    crc         2 bytes   CRC16-CCITT (init 0xFFFF) over length..payload
+"""
+import binascii
+import struct
+from telemetry_schema import pack_values, struct_format, unpack_values
+
+SYNC = b'\xaa\x55'
+HEADER = struct.Struct('<2sBH')    # sync, payload length, sequence number
+PAYLOAD = struct.Struct('<' + struct_format('h', 'f'))
+CRC = struct.Struct('<H')
+FRAME_SIZE = HEADER.size + PAYLOAD.size + CRC.size
+CRC_INIT = 0xFFFF
+
+
+def crc16(data):
+    """CRC16-CCITT as used by the firmware (binascii does it in C)"""
+    return binascii.crc_hqx(data, CRC_INIT)
+
+
+def encode_frame(values, seq):
+    """
+    Build one binary frame
+    Args:
+        values (list): Sample in telemetry_schema field order
+        seq (int): Sequence number, wrapped to 16 bits
+    Returns:
+        bytes: Complete frame including sync and CRC
+    """
+    body = (HEADER.pack(SYNC, PAYLOAD.size, seq & 0xFFFF) +
+            PAYLOAD.pack(*pack_values(values)))
+    return body + CRC.pack(crc16(body[len(SYNC):]))
+
+
+class BinaryFrameDecoder:
+    """Incremental decoder that resyncs on the sync word after garbage"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._last_seq = None
+        self.frames = 0           # Frames that passed the CRC
+        self.crc_errors = 0       # Candidate frames rejected by the CRC
+        self.dropped = 0          # Frames missing according to the sequence number
+        self.discarded_bytes = 0  # Bytes skipped while hunting for sync
+
+    def feed(self, data):
+        """
+        Add received bytes and decode every complete frame
+        Args:
+            data (bytes): Bytes read from the link
+        Returns:
+            list: (raw_frame, values) tuples in arrival order
+        """
+        buf = self._buffer
+        buf += data
+        size = len(buf)
+        frames = []
+        pos = 0
+
+        while True:
+            start = buf.find(SYNC, pos)
+            if start < 0:
+                # Keep a trailing first sync byte, the second may be in flight
+                keep = 1 if size > pos and buf[size - 1] == SYNC[0] else 0
+                self.discarded_bytes += size - pos - keep
+                pos = size - keep
+                break
+            self.discarded_bytes += start - pos
+            pos = start
+
+            end = start + FRAME_SIZE
+            if end > size:
+                break  # Incomplete frame, wait for more bytes
+
+            _, length, seq = HEADER.unpack_from(buf, start)
+            (crc,) = CRC.unpack_from(buf, end - CRC.size)
+            if length != PAYLOAD.size or crc16(buf[start + len(SYNC):end - CRC.size]) != crc:
+                # False sync or corrupted frame, resume the search one byte on
+                self.crc_errors += 1
+                self.discarded_bytes += 1
+                pos = start + 1
+                continue
+
+            values = unpack_values(PAYLOAD.unpack_from(buf, start + HEADER.size))
+            frames.append((bytes(buf[start:end]), values))
+
+            if self._last_seq is not None:
+                gap = (seq - self._last_seq - 1) & 0xFFFF
+                if gap < 0x8000:  # Larger gaps are duplicates or reordering
+                    self.dropped += gap
+            self._last_seq = seq
+            self.frames += 1
+            pos = end
+
+        del buf[:pos]
+        return frames
+
+    def stats(self):
+        """Counters as a dict for status reporting"""
+        return {
+            'frames': self.frames,
+            'crc_errors': self.crc_errors,
+            'dropped': self.dropped,
+            'discarded_bytes': self.discarded_bytes,
+        }
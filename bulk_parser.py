@@ -0,0 +1,271 @@
+"""
+Vectorized parser for recorded telemetry dumps.
+
+parse_buffer() turns a whole buffer of lines into NumPy columns in a few
+array passes instead of one Python call per line. Lines in the canonical
+form of the telemetry_schema layout take the vectorized path; anything
+unusual (spaces, non-ASCII, garbage before the '$') is handed to
+telemetry_schema.parse_frame, the parser every live reader uses, so valid
+input always parses the same way. Lines parse_frame rejects are reported
+by index in bad_lines.
+
+iter_parse() streams a file in fixed-size chunks so memory stays bounded:
+
+    for batch in iter_parse('capture.txt'):
+        heights = batch.columns['height']
+"""
+import numpy as np
+from telemetry_schema import FIELDS as SCHEMA, FRAME_START, SEPARATOR, numpy_fields, parse_frame
+
+FIELDS = tuple(field.name for field in SCHEMA)
+COLUMN_DTYPES = dict(numpy_fields(np.int64, np.float64, 'U1'))
+# The vectorized path handles number fields with an optional trailing char;
+# any other layout is parsed line by line
+INT_COLUMNS = [i for i, field in enumerate(SCHEMA) if field.kind == 'int']
+FLOAT_COLUMNS = [i for i, field in enumerate(SCHEMA) if field.kind == 'float']
+NUMBERS = len(INT_COLUMNS) + len(FLOAT_COLUMNS)
+TRAILING_CHAR = SCHEMA[-1].kind == 'char'
+VECTORIZED = (NUMBERS + TRAILING_CHAR == len(SCHEMA) and NUMBERS > 0
+              and len(FRAME_START) == 1 and len(SEPARATOR) == 1)
+START_BYTE, SEPARATOR_BYTE = ord(FRAME_START[0]), ord(SEPARATOR[0])
+DEFAULT_CHUNK = 8 * 1024 * 1024  # Bytes read per streaming step
+# Lines outside these bounds go through parse_frame
+MAX_LINE = 120
+MAX_INT_DIGITS = 18
+MAX_FLOAT_DIGITS = 15  # Exponent floats, too
+POWERS = 10.0 ** np.arange(MAX_FLOAT_DIGITS + 1)
+WHITESPACE = np.zeros(256, dtype=bool)
+WHITESPACE[[9, 10, 11, 12, 13, 32]] = True
+NUMBER_CHARS = np.zeros(256, dtype=bool)  # Number and separator bytes
+NUMBER_CHARS[np.frombuffer(b'0123456789.-', dtype=np.uint8)] = True
+NUMBER_CHARS[SEPARATOR_BYTE] = True
+# Per-byte class counters summed per line: '-', '.', separator and anything else
+CHAR_CODES = np.full(256, 1 << 24, dtype=np.int32)
+CHAR_CODES[np.frombuffer(b'0123456789', dtype=np.uint8)] = 0
+CHAR_CODES[[45, 46, SEPARATOR_BYTE]] = [1, 1 << 8, 1 << 16]
+
+
+class ParsedBatch:
+    """Columns of the good lines of one buffer, with their line numbers"""
+
+    def __init__(self, columns, lines, bad_lines):
+        self.columns = columns      # {field: array}, one entry per good line
+        self.lines = lines          # Line number of each good row
+        self.bad_lines = bad_lines  # Line numbers parse_frame rejected
+
+    def __len__(self):
+        return len(self.lines)
+
+    def rows(self):
+        """Rows as parse_data's current_values lists (for comparisons)"""
+        columns = [self.columns[name].tolist() for name in FIELDS]
+        return [list(row) for row in zip(*columns)]
+
+    @classmethod
+    def concatenate(cls, batches):
+        batches = list(batches)
+        if not batches:
+            return empty_batch()
+        columns = {name: np.concatenate([b.columns[name] for b in batches])
+                   for name in FIELDS}
+        return cls(columns, np.concatenate([b.lines for b in batches]),
+                   np.concatenate([b.bad_lines for b in batches]))
+
+
+def empty_batch():
+    columns = {name: np.empty(0, dtype=COLUMN_DTYPES[name]) for name in FIELDS}
+    return ParsedBatch(columns, np.empty(0, np.int64), np.empty(0, np.int64))
+
+
+def _digits(arr, starts, ends):
+    """
+    Horner evaluation of number fields known to hold only digits, a
+    leading '-' and at most one '.'
+    Returns:
+        (magnitude, decimals, dots): Digits as an integer, how many of them
+        follow the '.', and how many '.' were seen
+    """
+    magnitude = np.zeros(len(starts), dtype=np.int64)
+    decimals = np.zeros(len(starts), dtype=np.int64)
+    dots = np.zeros(len(starts), dtype=np.int64)
+    width = int((ends - starts).max()) if len(starts) else 0
+    for offset in range(width, 0, -1):
+        pos = ends - offset
+        byte = np.where(pos >= starts, arr[np.maximum(pos, 0)], 0)
+        digit = (byte >= 48) & (byte <= 57)
+        magnitude = np.where(digit, magnitude * 10 + (byte.astype(np.int64) - 48), magnitude)
+        decimals += digit & (dots > 0)
+        dots += byte == 46
+    return magnitude, decimals, dots
+
+
+def _fast_lines(arr, starts, ends, trimmed):
+    """
+    Vectorized parse of canonical lines
+    Returns:
+        (rows, columns): Line indices parsed here and their columns
+    """
+    line_count = len(starts)
+    separators = len(SCHEMA) - 1
+    # One pass counts every interesting byte class per line, a byte each
+    sums = np.add.reduceat(CHAR_CODES[arr], starts)
+    minus, dots = sums & 255, (sums >> 8) & 255
+    separator_count, others = (sums >> 16) & 255, (sums >> 24) & 127
+    first = arr[np.minimum(starts, arr.size - 1)]
+    fast_mask = ((trimmed > starts) & (trimmed - starts <= MAX_LINE) & (first == START_BYTE)
+                 & (separator_count == separators))
+    fast = np.flatnonzero(fast_mask)
+    cuts = np.flatnonzero(arr == SEPARATOR_BYTE)
+    if fast.size == line_count and cuts.size == separators * line_count:
+        cut_pos = cuts.reshape(-1, separators)
+    else:
+        cut_pos = cuts[fast_mask[np.searchsorted(ends, cuts)]].reshape(-1, separators)
+    field_starts = np.column_stack((starts[fast] + 1, cut_pos + 1))
+    field_ends = np.column_stack((cut_pos, trimmed[fast]))
+    lengths = field_ends - field_starts
+    numbers = INT_COLUMNS + FLOAT_COLUMNS
+
+    # Numbers are non-empty; integers fit int64 exactly, floats have at most
+    # 15 significant digits so the decimal conversion below is exact
+    ok = (lengths[:, numbers] > 0).all(axis=1)
+    ok &= (lengths[:, INT_COLUMNS] <= MAX_INT_DIGITS + 1).all(axis=1)
+    ok &= (lengths[:, FLOAT_COLUMNS] <= MAX_FLOAT_DIGITS + 2).all(axis=1)
+    has_status = np.zeros(len(fast), dtype=bool)
+    status_byte = np.zeros(len(fast), dtype=np.uint8)
+    if TRAILING_CHAR:
+        # The char is one ASCII byte that is not itself part of a number
+        has_status = lengths[:, -1] == 1
+        status_byte = np.where(has_status, arr[np.minimum(field_starts[:, -1], arr.size - 1)], 0)
+        ok &= ((lengths[:, -1] <= 1) & (status_byte < 128)
+               & ~(has_status & NUMBER_CHARS[status_byte]))
+    # Anything else is only the '$', the char and trailing whitespace
+    has_newline = ends[fast] < arr.size
+    ok &= others[fast] == 1 + has_status + (ends - trimmed)[fast] + has_newline
+    # A '-' only leads a number, and never stands alone
+    signs = arr[field_starts[:, numbers]] == 45
+    ok &= (minus[fast] == signs.sum(axis=1)) & ~(signs & (lengths[:, numbers] == 1)).any(axis=1)
+    int_signs, float_signs = signs[:, :len(INT_COLUMNS)], signs[:, len(INT_COLUMNS):]
+
+    shape = (len(fast), len(INT_COLUMNS))
+    magnitude, _, int_dots = _digits(arr, field_starts[:, INT_COLUMNS].ravel(),
+                                     field_ends[:, INT_COLUMNS].ravel())
+    int_digits = lengths[:, INT_COLUMNS] - int_signs
+    ok &= ((int_dots.reshape(shape) == 0) & (int_digits <= MAX_INT_DIGITS)).all(axis=1)
+    integers = np.where(int_signs, -magnitude.reshape(shape), magnitude.reshape(shape))
+
+    # At most one '.' per float field, none elsewhere, and a digit around it
+    shape = (len(fast), len(FLOAT_COLUMNS))
+    mantissa, decimals, float_dots = (part.reshape(shape) for part in _digits(
+        arr, field_starts[:, FLOAT_COLUMNS].ravel(), field_ends[:, FLOAT_COLUMNS].ravel()))
+    float_digits = lengths[:, FLOAT_COLUMNS] - float_signs - float_dots
+    ok &= dots[fast] == float_dots.sum(axis=1)
+    ok &= ((float_dots <= 1) & (float_digits >= 1) & (float_digits <= MAX_FLOAT_DIGITS)).all(axis=1)
+    # Both operands are exact doubles, so the quotient is correctly rounded
+    # like float() would do
+    floats = mantissa[ok] / POWERS[decimals[ok]]
+    floats = np.where(float_signs[ok], -floats, floats)
+
+    columns = {}
+    for index, column in enumerate(INT_COLUMNS):
+        columns[FIELDS[column]] = integers[ok, index]
+    for index, column in enumerate(FLOAT_COLUMNS):
+        columns[FIELDS[column]] = floats[:, index]
+    if TRAILING_CHAR:
+        columns[FIELDS[-1]] = status_byte[ok].astype(np.uint8).view('S1').astype('U1')
+    return fast[ok], columns
+
+
+def parse_buffer(data, first_line=0):
+    """
+    Parse every line of a buffer
+    Args:
+        data (bytes): Whole lines of text frames; a final line without a
+            newline is parsed too
+        first_line (int): Line number of the buffer's first line
+    Returns:
+        ParsedBatch
+    """
+    arr = np.frombuffer(data, dtype=np.uint8)
+    if arr.size == 0:
+        return empty_batch()
+    newlines = np.flatnonzero(arr == 10)
+    ends = newlines if arr[-1] == 10 else np.append(newlines, arr.size)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    line_count = len(starts)
+
+    # Trim trailing whitespace (\r and friends), as str.strip() would
+    trimmed = ends.copy()
+    while True:
+        strip = (trimmed > starts) & WHITESPACE[arr[np.maximum(trimmed - 1, 0)]]
+        if not strip.any():
+            break
+        trimmed[strip] -= 1
+
+    if VECTORIZED:
+        good, columns = _fast_lines(arr, starts, ends, trimmed)
+    else:
+        good, columns = np.empty(0, np.int64), empty_batch().columns
+
+    # Everything else goes through the reference parser
+    slow = np.ones(line_count, dtype=bool)
+    slow[good] = False
+    extra_lines, extra_rows, bad = [], [], []
+    for line in np.flatnonzero(slow):
+        text = data[starts[line]:ends[line]].decode('utf-8', 'replace').strip()
+        try:
+            values = parse_frame(text)
+        except (ValueError, IndexError):
+            values = None
+        if values is None or not all(-2**63 <= values[i] < 2**63 for i in INT_COLUMNS):
+            bad.append(line)
+        else:
+            extra_lines.append(line)
+            extra_rows.append(values)
+
+    lines = good
+    if extra_rows:
+        lines = np.concatenate((good, extra_lines))
+        order = np.argsort(lines, kind='stable')
+        lines = lines[order]
+        for index, name in enumerate(FIELDS):
+            extra = np.array([row[index] for row in extra_rows], dtype=COLUMN_DTYPES[name])
+            columns[name] = np.concatenate((columns[name], extra))[order]
+    return ParsedBatch(columns, lines.astype(np.int64) + first_line,
+                       np.array(bad, dtype=np.int64) + first_line)
+
+
+def iter_parse(source, chunk_size=DEFAULT_CHUNK):
+    """
+    Stream a dump in chunks of about chunk_size bytes
+    Args:
+        source: Path, or a binary file object
+    Yields:
+        ParsedBatch per chunk, with line numbers counted from the file start
+    """
+    f = open(source, 'rb') if isinstance(source, str) else source
+    try:
+        carry = b''
+        first_line = 0
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            data = carry + block
+            cut = data.rfind(b'\n') + 1
+            if cut == 0:
+                carry = data  # No complete line yet
+                continue
+            carry = data[cut:]
+            batch = parse_buffer(data[:cut], first_line)
+            first_line += data.count(b'\n', 0, cut)
+            yield batch
+        if carry:
+            yield parse_buffer(carry, first_line)
+    finally:
+        if f is not source:
+            f.close()
+
+
+def parse_file(path, chunk_size=DEFAULT_CHUNK):
+    """Parse a whole dump into one ParsedBatch"""
+    return ParsedBatch.concatenate(iter_parse(path, chunk_size))
@@ -1,16 +1,49 @@
+import time
+STARTED = time.perf_counter()  # Start of the --profile-startup timeline
 import sys
 import os
+import argparse
 import threading
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, 
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QLabel,
                             QVBoxLayout, QHBoxLayout, QMessageBox)
-from PyQt5.QtWebEngineWidgets import QWebEngineView
-from PyQt5.QtCore import QUrl, QFileInfo
+from PyQt5.QtCore import Qt, QUrl, QEvent, QTimer
 from PyQt5.QtWebChannel import QWebChannel
-from functions import MapLoader, SerialProcessor, DataDisplay, JSBridge
+from functions import (MapLoader, SerialProcessor, DataDisplay, JSBridge,
+                       DisplayUpdater, PositionFeed)
+from flight_recorder import FlightRecorder, default_log_path
+from serial_sim import SimulatedLink, add_simulation_args, frames_from_args
+from latency import LatencyTracker, StartupTimeline
+from command_queue import CommandTracker
+from tile_store import MBTilesStore, TileCache, open_tile_source, DEFAULT_STORE
+from tile_scheme import TILE_URL, register_tile_scheme, install_tile_handler
+
+DISPLAY_REFRESH_HZ = 30  # Telemetry widget refresh rate, independent of packet rate
+TILE_CACHE_BYTES = 64 * 1024 * 1024  # In-memory tile cache in front of the store
 
 class DroneControlApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, port=None, connection=None, latency_log=None,
+                 fast_start=False, timeline=None, ack_commands=False, frame_format='ascii'):
+        """
+        Args:
+            port (str): Serial device or pyserial URL, auto-detected when None
+            connection: Open serial object to use instead (simulated loop:// link)
+            latency_log (str): Write latency statistics here on exit
+            fast_start (bool): Show telemetry first and build the map (Chromium)
+                only after the first paint
+            timeline (StartupTimeline): Record start-up checkpoints here
+            ack_commands (bool): Send sequence-numbered commands and only
+                change the flight state once the drone acknowledges them
+            frame_format (str): 'ascii' for $... lines, 'binary' for binary frames
+        """
         super().__init__()
+        self.port = port
+        self.connection = connection
+        self.latency_log = latency_log
+        self.fast_start = fast_start
+        self.timeline = timeline
+        self.ack_commands = ack_commands
+        self.frame_format = frame_format
+        self.web_view = None
         self.setWindowTitle("Drone Control System")
         self.setGeometry(100, 100, 1300, 800)
         
@@ -18,18 +51,57 @@ class DroneControlApp(QMainWindow):
         self.drone_status = 0
         
         self.init_components()
+        self.mark("components built")
         self.init_ui()
-        self.check_required_files()
-        self.init_threads()
-        self.connect_signals()
+        self.mark("ui built")
+        if fast_start:
+            # Telemetry first: the serial reader starts before any map work
+            self.init_threads()
+            self.mark("threads started")
+            self.connect_signals()
+        else:
+            self.check_required_files()
+            self.init_threads()
+            self.mark("threads started")
+            self.connect_signals()
+            self.init_map()
+        self.data_display.installEventFilter(self)  # Watch for the first paint
+
+    def mark(self, name):
+        """Start-up checkpoint for --profile-startup"""
+        if self.timeline is not None:
+            self.timeline.mark(name)
+
+    def eventFilter(self, watched, event):
+        if watched is self.data_display and event.type() == QEvent.Paint:
+            self.data_display.removeEventFilter(self)
+            self.mark("first paint")
+            if self.fast_start:
+                QTimer.singleShot(0, self.init_map)  # After the panel is on screen
+        return super().eventFilter(watched, event)
 
     def init_components(self):
         """Initialize all application components"""
-        self.map_loader = MapLoader()
-        self.serial_processor = SerialProcessor()
+        self.map_loader = MapLoader(tile_url=TILE_URL)
+        self.serial_processor = SerialProcessor(self.port, self.connection)
+        self.serial_processor.frame_format = self.frame_format
+        self.flight_recorder = FlightRecorder(default_log_path())
+        self.serial_processor.recorder = self.flight_recorder
+        if self.ack_commands:
+            self.serial_processor.acks = CommandTracker()
         self.data_display = DataDisplay()
-        self.web_view = QWebEngineView()
+        self.display_updater = DisplayUpdater(self.data_display, DISPLAY_REFRESH_HZ)
+        self.latency = LatencyTracker()
+        self.serial_processor.latency = self.latency
+        self.data_display.set_latency_tracker(self.latency)
+        # Tiles are served from the packed store (or tiles/ as a fallback)
+        # through an in-memory LRU, so panning and view resets hit memory
+        self.tile_source = open_tile_source()
+        self.tile_cache = TileCache(self.tile_source, TILE_CACHE_BYTES)
         self.js_bridge = JSBridge(self)
+        # Drone marker and track on the map; call position_feed.push_position()
+        # with each fix
+        self.position_feed = PositionFeed(DISPLAY_REFRESH_HZ)
 
     def init_ui(self):
         """Initialize the user interface"""
@@ -43,18 +115,42 @@ class DroneControlApp(QMainWindow):
         left_layout.addStretch()
         layout.addWidget(left_panel)
         
-        # Right panel (map)
-        layout.addWidget(self.web_view, stretch=2)
+        # Right panel (map), a placeholder until init_map() creates the web view
+        self.map_placeholder = QLabel("Loading map...")
+        self.map_placeholder.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.map_placeholder, stretch=2)
+        self.main_layout = layout
         
         self.setCentralWidget(central_widget)
 
+    def init_map(self):
+        """Create the web view, tile handler and web channel, then load the map"""
+        if self.fast_start:
+            self.check_required_files()  # Integrity check kept off the first paint
+        # Imported here so Chromium start-up stays off the critical path
+        # (needs Qt.AA_ShareOpenGLContexts before the QApplication)
+        from PyQt5.QtWebEngineWidgets import QWebEngineView
+        self.web_view = QWebEngineView()
+        self.tile_handler = install_tile_handler(self.web_view, self.tile_cache)
+        self.web_view.loadFinished.connect(lambda ok: self.mark("map loaded"))
+        
+        # Set up web channel for JavaScript-Python communication
+        self.web_channel = QWebChannel()
+        self.web_channel.registerObject('pyQtBridge', self.js_bridge)
+        self.web_channel.registerObject('positionFeed', self.position_feed)
+        self.position_feed.start()
+        self.web_view.page().setWebChannel(self.web_channel)
+        
+        self.main_layout.replaceWidget(self.map_placeholder, self.web_view)
+        self.map_placeholder.deleteLater()
+        self.mark("map view created")
+        self.load_map_page()
+
     def check_required_files(self):
         """Verify all required files for offline operation exist"""
         required_files = [
             'leaflet.js',
-            'leaflet.css',
-            os.path.join('tiles', '12'),  # Check for at least one zoom level
-            'map.html'
+            'leaflet.css'
         ]
         
         missing_files = []
@@ -62,6 +158,21 @@ class DroneControlApp(QMainWindow):
             if not os.path.exists(file):
                 missing_files.append(file)
         
+        if isinstance(self.tile_source, MBTilesStore):
+            # Header only: a full check reads the whole pack (map_utils.py --check)
+            report = self.tile_source.check_header()
+            if report['ok']:
+                self.data_display.update_status(
+                    f"Tile store: z{report['minzoom']}-z{report['maxzoom']}")
+            elif report['missing']:
+                missing_files.append(f"{DEFAULT_STORE} is not a tile store "
+                                     f"(missing {', '.join(report['missing'])})")
+            else:
+                missing_files.append(f"{DEFAULT_STORE} has no tiles")
+        elif not os.path.exists(os.path.join('tiles', '12')):
+            # Check for at least one zoom level
+            missing_files.append(f"{DEFAULT_STORE} or " + os.path.join('tiles', '12'))
+        
         if missing_files:
             msg = "Missing files for offline operation:\n" + "\n".join(missing_files)
             QMessageBox.warning(self, "Missing Files", 
@@ -70,48 +181,45 @@ class DroneControlApp(QMainWindow):
 
     def init_threads(self):
         """Initialize and start all background threads"""
+        center_lat, center_lon = self.map_loader.center
+        zoom = self.map_loader.zoom
         self.threads = [
-            threading.Thread(target=self.map_loader.run, daemon=True),
-            threading.Thread(target=self.serial_processor.run, daemon=True)
+            threading.Thread(target=self.serial_processor.run, daemon=True),
+            # Warm the tile cache with the levels around the initial view
+            threading.Thread(target=self.tile_cache.warm, daemon=True,
+                             args=(center_lat, center_lon, range(zoom - 1, zoom + 2)))
         ]
         
+        self.flight_recorder.start()
         for thread in self.threads:
             thread.start()
 
     def connect_signals(self):
         """Connect all signals and slots"""
-        # Map loader signals
-        self.map_loader.map_ready.connect(self.load_map)
-        self.map_loader.status_update.connect(
-            self.data_display.update_status)
-        
-        # Serial processor signals
-        self.serial_processor.data_processed.connect(
-            self.data_display.update_values)
+        # Serial processor samples are coalesced and drawn at the display rate
+        self.serial_processor.sample_sink = self.display_updater.submit
+        self.display_updater.frame_shown.connect(self.first_telemetry)
+        self.display_updater.start()
         self.serial_processor.status_update.connect(
             self.data_display.update_status)
+        self.serial_processor.command_acked.connect(self.command_acknowledged)
+        self.serial_processor.command_failed.connect(self.command_not_acknowledged)
         
         # Button connections
         self.data_display.takeoff_button.clicked.connect(self.takeoff)
         self.data_display.land_button.clicked.connect(self.land)
-        
-        # Set up web channel for JavaScript-Python communication
-        self.web_channel = QWebChannel()
-        self.web_channel.registerObject('pyQtBridge', self.js_bridge)
-        self.web_view.page().setWebChannel(self.web_channel)
 
-    def load_map(self, path):
-        """
-        Load the map HTML file with proper web channel setup
-        Args:
-            path (str): Path to the map HTML file
-        """
-        file_info = QFileInfo(path)
-        if file_info.exists():
-            url = QUrl.fromLocalFile(file_info.absoluteFilePath())
-            self.web_view.setUrl(url)
-        else:
-            self.data_display.update_status("Map file not found")
+    def first_telemetry(self, folded):
+        """Checkpoint for the first sample drawn, then stop listening"""
+        self.display_updater.frame_shown.disconnect(self.first_telemetry)
+        self.mark("first telemetry")
+
+    def load_map_page(self):
+        """Show the map page straight from memory (no map.html round trip)"""
+        # Relative leaflet.js/leaflet.css resolve against the working directory
+        base_url = QUrl.fromLocalFile(os.path.abspath(self.map_loader.cache_path))
+        self.web_view.setHtml(self.map_loader.html(), base_url)
+        self.data_display.update_status("Map loaded")
 
     def handle_direction(self, direction):
         """
@@ -137,6 +245,11 @@ class DroneControlApp(QMainWindow):
                 QMessageBox.No)
             
             if reply == QMessageBox.Yes:
+                if self.ack_commands:
+                    # Flight state changes when the drone confirms (command_acknowledged)
+                    self.data_display.update_status("Takeoff requested, waiting for drone")
+                    self.serial_processor.send_command("CMD:TAKEOFF")
+                    return
                 # Update status immediately first
                 self.drone_status = 1
                 self.data_display.update_flight_status(1)
@@ -150,6 +263,10 @@ class DroneControlApp(QMainWindow):
     def land(self):
         """Handle land button click"""
         if self.drone_status == 1:  # Only if currently flying
+            if self.ack_commands:
+                self.data_display.update_status("Landing requested, waiting for drone")
+                self.serial_processor.send_command("CMD:LAND")
+                return
             # Update status immediately first
             self.drone_status = 0
             self.data_display.update_flight_status(0)
@@ -160,6 +277,29 @@ class DroneControlApp(QMainWindow):
         else:
             self.data_display.update_status("Drone is already landed")
 
+    def command_acknowledged(self, command, rtt_ms):
+        """
+        The drone confirmed a command
+        Args:
+            command (str): Command text
+            rtt_ms (float): Round trip from the last send to the acknowledgement
+        """
+        if command == "CMD:TAKEOFF":
+            self.drone_status = 1
+            self.data_display.update_flight_status(1)
+            self.data_display.update_status(f"Drone is now flying ({rtt_ms:.0f} ms)")
+        elif command == "CMD:LAND":
+            self.drone_status = 0
+            self.data_display.update_flight_status(0)
+            self.data_display.update_status(f"Drone is landing ({rtt_ms:.0f} ms)")
+        else:
+            self.data_display.update_status(f"{command} acknowledged ({rtt_ms:.0f} ms)")
+
+    def command_not_acknowledged(self, command):
+        """A command was never confirmed; the flight state is left as it was"""
+        if self.ack_commands:
+            self.data_display.update_status(f"{command} not acknowledged by the drone")
+
     def closeEvent(self, event):
         """
         Handle window close event
@@ -184,14 +324,86 @@ class DroneControlApp(QMainWindow):
                 self.data_display.update_status("Emergency landing initiated")
         
         # Clean up resources
-        self.map_loader.stop()
+        self.display_updater.stop()
+        self.position_feed.stop()
         self.serial_processor.stop()
         for thread in self.threads:
             thread.join(timeout=1)
+        self.flight_recorder.stop()
+        if self.flight_recorder.rejected:
+            print(f"Flight log: {self.flight_recorder.rejected} out-of-range frames skipped")
+        stats = self.serial_processor.command_stats()
+        if stats['sent'] or stats['failed']:
+            print(f"Commands: {stats['sent']} sent, {stats['failed']} failed, "
+                  f"{stats['coalesced']} coalesced, {stats['preempted']} preempted; "
+                  f"enqueue-to-wire p50 {stats['p50']:.1f} ms, p99 {stats['p99']:.1f} ms"
+                  if stats['sent'] else f"Commands: {stats['failed']} failed")
+        if self.serial_processor.acks is not None:
+            stats = self.serial_processor.acks.stats()
+            rtt = (f"; round trip p50 {stats['p50']:.1f} ms, p99 {stats['p99']:.1f} ms"
+                   if 'p50' in stats else "")
+            print(f"Acknowledgements: {stats['acked']} acked, {stats['retried']} re-sent, "
+                  f"{stats['failed']} failed, {stats['pending']} pending{rtt}")
+        stats = self.serial_processor.supervisor.stats()
+        if stats['reconnects']:
+            print(f"Serial link: {stats['reconnects']} reconnects, outage p50 "
+                  f"{stats['p50']:.0f} ms, p99 {stats['p99']:.0f} ms")
+        stats = self.tile_cache.stats()
+        print(f"Tile cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['evictions']} evictions ({stats['hit_rate']:.0%} hit rate)")
+        if isinstance(self.tile_source, MBTilesStore):
+            self.tile_source.close()
+        if self.latency_log:
+            self.latency.export(self.latency_log)
+        if self.timeline is not None:
+            print(self.timeline.report())
         event.accept()
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Drone Control System")
+    parser.add_argument('--port', help="serial device or pyserial URL (default: auto-detect)")
+    parser.add_argument('--simulate', action='store_true',
+                        help="run against a simulated link instead of hardware")
+    parser.add_argument('--latency-log', metavar='PATH',
+                        help="export per-stage latency statistics (JSON) on exit")
+    parser.add_argument('--ack-commands', action='store_true',
+                        help="send sequence-numbered commands and wait for the drone "
+                             "to acknowledge them (re-sent on timeout)")
+    parser.add_argument('--fast-start', action='store_true',
+                        help="show telemetry first, start the map after the first paint")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="print a start-up timeline (imports, widgets, threads, "
+                             "first paint, first telemetry, map)")
+    add_simulation_args(parser)
+    # Anything unrecognised is left for Qt (-style, -platform, ...)
+    return parser.parse_known_args(argv[1:])
+
+
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = DroneControlApp()
+    args, qt_args = parse_args(sys.argv)
+    timeline = None
+    if args.profile_startup:
+        timeline = StartupTimeline(STARTED)
+        timeline.mark("imports")
+    link = None
+    if args.simulate or args.replay:
+        link = SimulatedLink(frames_from_args(args), args.speed, ack=args.ack_commands)
+        link.start()
+    
+    register_tile_scheme()  # Must precede the QApplication
+    # Lets QtWebEngineWidgets be imported after the QApplication exists
+    QApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
+    app = QApplication(sys.argv[:1] + qt_args)
+    if timeline is not None:
+        timeline.mark("QApplication")
+    port, connection = (link.port, link.connection) if link is not None else (args.port, None)
+    window = DroneControlApp(port, connection, args.latency_log,
+                             fast_start=args.fast_start, timeline=timeline,
+                             ack_commands=args.ack_commands,
+                             frame_format='binary' if args.binary else 'ascii')
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    window.mark("window shown")
+    exit_code = app.exec_()
+    if link is not None:
+        link.stop()
+    sys.exit(exit_code)
\ No newline at end of file
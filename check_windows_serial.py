@@ -1,13 +1,17 @@
+import argparse
+import json
 import serial
 import serial.tools.list_ports
 import time
+import numpy as np
+from binary_frames import BinaryFrameDecoder
+from flight_recorder import FlightRecorder
+from telemetry_schema import FIELDS, FRAME_START, SEPARATOR, default_values, parse_frame
+
+JITTER_PERCENTILES = (50, 95, 99)
 
 # Global variables to store parsed data
-int1 = 0
-int2 = 0
-int3 = 0
-float_val = 0.0
-char_val = ''
+last_values = default_values()
 valid_data_count = 0
 error_count = 0
 ser = None
@@ -35,7 +39,8 @@ def connect_serial(port_name=None, baud_rate=57600):
     try:
         ser = serial.Serial(port_name, baud_rate, timeout=1)
         print(f"Connected to {port_name} at {baud_rate} baud")
-        print("Waiting for data in format: $int1,int2,int3,float.2,char1\\n")
+        print("Waiting for data in format: "
+              f"{FRAME_START}{SEPARATOR.join(field.name for field in FIELDS)}\\n")
         return True
     except serial.SerialException as e:
         print(f"Connection error: {e}")
@@ -44,30 +49,27 @@ def connect_serial(port_name=None, baud_rate=57600):
 
 def parse_data(data_string):
     """
-    Parse data in format "$int1,int2,int3,float.2,char1"
+    Parse one text frame (layout in telemetry_schema)
     Returns True if parsing was successful
     """
-    global int1, int2, int3, float_val, char_val, valid_data_count, error_count
+    global last_values, valid_data_count, error_count
 
     try:
-        # Remove $ and \n if present
-        clean_data = data_string.strip().replace('$', '')
+        clean_data = data_string.strip()
         if not clean_data:
             return False
 
-        parts = clean_data.split(',')
-        if len(parts) != 5:
-            print(f"Error: Expected 5 values, got {len(parts)}")
+        values = parse_frame(clean_data)
+        if values is None:
+            if clean_data.startswith(FRAME_START):
+                print(f"Error: Expected {len(FIELDS)} values, "
+                      f"got {len(clean_data.split(SEPARATOR))}")
+            else:
+                print(f"Error: Missing '{FRAME_START}' - Data: {data_string}")
             error_count += 1
             return False
 
-        # Parse each component
-        int1 = int(parts[0])
-        int2 = int(parts[1])
-        int3 = int(parts[2])
-        float_val = float(parts[3])
-        char_val = parts[4][0] if parts[4] else ''  # Take first character only
-
+        last_values = values
         valid_data_count += 1
         return True
 
@@ -77,10 +79,223 @@ def parse_data(data_string):
         return False
 
 
+def current_values():
+    """The last parsed packet, in telemetry_schema field order"""
+    return list(last_values)
+
+
+def parse_binary_data(decoder, chunk, recorder=None):
+    """
+    Feed raw bytes to a BinaryFrameDecoder and keep the newest frame
+    Returns the number of frames decoded
+    """
+    global last_values, valid_data_count, error_count
+
+    frames = decoder.feed(chunk)
+    for raw, values in frames:
+        last_values = values
+        if recorder is not None:
+            recorder.record(raw, values)
+    valid_data_count += len(frames)
+    error_count = decoder.crc_errors
+    return len(frames)
+
+
 def display_current_values():
     """Display the current parsed values"""
-    print(f"Values: int1={int1}, int2={int2}, int3={int3}, "
-          f"float={float_val:.2f}, char='{char_val}'")
+    print("Values: " + ", ".join(f"{field.name}={field.text(value)}"
+                                 for field, value in zip(FIELDS, last_values)))
+
+
+class LinkDiagnostics:
+    """
+    Link quality counters for headless qualification runs
+
+    Nothing is printed per packet; report() summarizes the last interval
+    (rates, errors by type, inter-arrival jitter, longest gap) plus totals
+    for the whole run. Arrival times are per read, so packets that come in
+    one USB transfer share a timestamp.
+    """
+    ERROR_TYPES = ('no_start', 'field_count', 'bad_value', 'decode', 'overlong',
+                   'crc', 'dropped')
+
+    def __init__(self, max_line=256, now=None):
+        now = time.perf_counter() if now is None else now
+        self.max_line = max_line
+        self.buffer = bytearray()
+        self.started = now
+        self.last_packet = None
+        self.total_packets = 0
+        self.total_bytes = 0
+        self.total_errors = dict.fromkeys(self.ERROR_TYPES, 0)
+        self.longest_gap = 0.0  # Seconds, whole run
+        self._crc_errors = 0
+        self._dropped = 0
+        self._reset_window(now)
+
+    def _reset_window(self, now):
+        self.window_start = now
+        self.packets = 0
+        self.bytes = 0
+        self.errors = dict.fromkeys(self.ERROR_TYPES, 0)
+        self.intervals = []  # Seconds between consecutive packets
+        self.window_gap = 0.0
+
+    def _error(self, kind, count=1):
+        self.errors[kind] += count
+        self.total_errors[kind] += count
+
+    def _packet(self, arrival):
+        if self.last_packet is not None:
+            interval = arrival - self.last_packet
+            self.intervals.append(interval)
+            self.window_gap = max(self.window_gap, interval)
+            self.longest_gap = max(self.longest_gap, interval)
+        self.last_packet = arrival
+        self.packets += 1
+        self.total_packets += 1
+
+    def classify(self, line):
+        """
+        Check one received line with the schema parser
+        Returns:
+            str or None: Error type, None for a good packet
+        """
+        try:
+            text = line.decode('utf-8')
+        except UnicodeDecodeError:
+            return 'decode'
+        try:
+            values = parse_frame(text)
+        except ValueError:
+            return 'bad_value'
+        if values is None:
+            return 'field_count' if text.startswith(FRAME_START) else 'no_start'
+        return None
+
+    def feed_text(self, chunk, arrival):
+        """Count the lines completed by a chunk of $... text"""
+        self.bytes += len(chunk)
+        self.total_bytes += len(chunk)
+        self.buffer += chunk
+        while True:
+            end = self.buffer.find(b'\n')
+            if end < 0:
+                if len(self.buffer) > self.max_line:
+                    self._error('overlong')  # No newline in sight: resync
+                    self.buffer.clear()
+                return
+            line = bytes(self.buffer[:end]).strip()
+            del self.buffer[:end + 1]
+            if not line:
+                continue
+            kind = 'overlong' if len(line) > self.max_line else self.classify(line)
+            if kind is None:
+                self._packet(arrival)
+            else:
+                self._error(kind)
+
+    def feed_binary(self, decoder, chunk, arrival):
+        """Count the frames a BinaryFrameDecoder completes from a chunk"""
+        self.bytes += len(chunk)
+        self.total_bytes += len(chunk)
+        for _ in decoder.feed(chunk):
+            self._packet(arrival)
+        self._error('crc', decoder.crc_errors - self._crc_errors)
+        self._error('dropped', decoder.dropped - self._dropped)
+        self._crc_errors, self._dropped = decoder.crc_errors, decoder.dropped
+
+    def report(self, now=None):
+        """
+        Summarize the interval since the previous report and start a new one
+        Returns:
+            dict: Interval rates, errors and gaps (ms), plus run totals
+        """
+        now = time.perf_counter() if now is None else now
+        elapsed = max(now - self.window_start, 1e-9)
+        if self.last_packet is not None:
+            # A link that has gone silent is a gap still in progress
+            silent = now - self.last_packet
+            self.window_gap = max(self.window_gap, silent)
+            self.longest_gap = max(self.longest_gap, silent)
+        errors = sum(self.errors.values())
+        report = {
+            'time': round(now - self.started, 3),
+            'packets_per_s': self.packets / elapsed,
+            'bytes_per_s': self.bytes / elapsed,
+            'error_rate': errors / (self.packets + errors) if self.packets + errors else 0.0,
+            'errors': {kind: count for kind, count in self.errors.items() if count},
+            'longest_gap_ms': self.window_gap * 1000.0,
+        }
+        if self.intervals:
+            intervals = np.array(self.intervals)
+            # Jitter: how far each inter-arrival time strays from the typical one
+            jitter = np.abs(intervals - np.median(intervals)) * 1000.0
+            report['interval_ms'] = float(np.median(intervals)) * 1000.0
+            report.update((f"jitter_p{p}_ms", float(value)) for p, value in
+                          zip(JITTER_PERCENTILES, np.percentile(jitter, JITTER_PERCENTILES)))
+        total_errors = sum(self.total_errors.values())
+        lines = self.total_packets + total_errors
+        report['total'] = {'packets': self.total_packets, 'bytes': self.total_bytes,
+                           'errors': total_errors,
+                           'error_rate': total_errors / lines if lines else 0.0,
+                           'longest_gap_ms': self.longest_gap * 1000.0}
+        self._reset_window(now)
+        return report
+
+    @staticmethod
+    def format_report(report):
+        """One console line per interval"""
+        line = (f"[{report['time']:8.1f}s] {report['packets_per_s']:8.1f} pkt/s "
+                f"{report['bytes_per_s']:9.0f} B/s  errors {report['error_rate'] * 100:5.2f}%")
+        if report['errors']:
+            line += " (" + ", ".join(f"{kind} {count}" for kind, count
+                                     in report['errors'].items()) + ")"
+        if 'jitter_p50_ms' in report:
+            line += (f"  jitter p50/p95/p99 {report['jitter_p50_ms']:.2f}/"
+                     f"{report['jitter_p95_ms']:.2f}/{report['jitter_p99_ms']:.2f} ms")
+        line += (f"  gap {report['longest_gap_ms']:.1f} ms"
+                 f" (run max {report['total']['longest_gap_ms']:.1f} ms)")
+        return line
+
+
+def run_diagnostics(decoder=None, interval=1.0, duration=None, jsonl_path=None):
+    """
+    Read the link without per-packet output, reporting every interval
+    Args:
+        decoder (BinaryFrameDecoder): Set for binary frames, None for text
+        interval (float): Seconds between reports
+        duration (float): Stop after this many seconds, None to run until Ctrl+C
+        jsonl_path (str): Append each report to this file as a JSON line
+    Returns:
+        LinkDiagnostics: The final counters
+    """
+    diagnostics = LinkDiagnostics()
+    ser.timeout = min(0.05, interval)  # Never block past a report
+    jsonl = open(jsonl_path, 'a') if jsonl_path else None
+    next_report = diagnostics.started + interval
+    try:
+        while duration is None or time.perf_counter() - diagnostics.started < duration:
+            chunk = ser.read(max(1, ser.in_waiting))
+            now = time.perf_counter()
+            if chunk:
+                if decoder is not None:
+                    diagnostics.feed_binary(decoder, chunk, now)
+                else:
+                    diagnostics.feed_text(chunk, now)
+            if now >= next_report:
+                report = diagnostics.report(now)
+                print(LinkDiagnostics.format_report(report), flush=True)
+                if jsonl is not None:
+                    jsonl.write(json.dumps(report) + "\n")
+                    jsonl.flush()
+                next_report += interval * max(1, int((now - next_report) // interval) + 1)
+    except KeyboardInterrupt:
+        print("\nStopping diagnostics...")
+    finally:
+        if jsonl is not None:
+            jsonl.close()
+    return diagnostics
 
 
 def close_serial():
@@ -92,21 +307,65 @@ def close_serial():
     print(f"Summary: {valid_data_count} valid packets, {error_count} errors")
 
 
-def main():
-    # Try automatic connection first
-    if not connect_serial(baud_rate=57600):
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read and display drone telemetry")
+    parser.add_argument('--binary', action='store_true',
+                        help="expect binary frames instead of $... text lines")
+    parser.add_argument('--record', metavar='PATH',
+                        help="append every frame to a binary flight log")
+    parser.add_argument('--port', help="serial port, e.g. COM3 or a serial_sim.py pty")
+    parser.add_argument('--baud', type=int, default=57600, help="baud rate")
+    parser.add_argument('--diagnostics', action='store_true',
+                        help="no per-packet output; report link quality every interval")
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help="seconds between diagnostics reports")
+    parser.add_argument('--duration', type=float,
+                        help="stop diagnostics after this many seconds")
+    parser.add_argument('--jsonl', metavar='PATH',
+                        help="append every diagnostics report to PATH as JSON lines")
+    parser.add_argument('--max-error-rate', type=float, metavar='RATE',
+                        help="exit with status 1 if the run's error rate exceeds RATE")
+    args = parser.parse_args(argv)
+
+    # Try the given or automatically found port first
+    if not connect_serial(args.port, baud_rate=args.baud):
         # Manual connection if automatic fails
         port_name = input("Enter COM port (e.g., COM3): ")
         baud_rate = int(input("Enter baud rate (default 57600): ") or "57600")
         if not connect_serial(port_name, baud_rate):
             exit(1)
 
+    decoder = BinaryFrameDecoder() if args.binary else None
+    if args.diagnostics:
+        diagnostics = run_diagnostics(decoder, args.interval, args.duration, args.jsonl)
+        total = diagnostics.report()['total']
+        print(f"Diagnostics: {total['packets']} packets, {total['bytes']} bytes, "
+              f"{total['errors']} errors ({total['error_rate'] * 100:.2f}%), "
+              f"longest gap {total['longest_gap_ms']:.1f} ms")
+        ser.close()
+        if args.max_error_rate is not None and total['error_rate'] > args.max_error_rate:
+            exit(1)
+        return
+
+    recorder = None
+    if args.record:
+        recorder = FlightRecorder(args.record)
+        recorder.start()
     try:
         while True:
+            if decoder is not None:
+                # Block for the first byte, then take everything waiting
+                chunk = ser.read(max(1, ser.in_waiting))
+                if chunk and parse_binary_data(decoder, chunk, recorder):
+                    display_current_values()
+                continue
+
             if ser.in_waiting > 0:
                 data = ser.readline().decode('utf-8').strip()
-                if data.startswith('$'):
+                if data.startswith(FRAME_START):
                     if parse_data(data):
+                        if recorder is not None:
+                            recorder.record(data, current_values())
                         display_current_values()
 
             # Add your custom processing here
@@ -119,6 +378,15 @@ def main():
     except Exception as e:
         print(f"Error: {e}")
     finally:
+        if recorder is not None:
+            recorder.stop()
+            print(f"Recorded {recorder.records} frames to {args.record}"
+                  + (f" ({recorder.rejected} out-of-range frames skipped)"
+                     if recorder.rejected else ""))
+        if decoder is not None:
+            print(f"Binary link: {decoder.crc_errors} CRC errors, "
+                  f"{decoder.dropped} dropped frames, "
+                  f"{decoder.discarded_bytes} bytes skipped")
         close_serial()
 
 
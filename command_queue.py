@@ -0,0 +1,291 @@
+"""
+Prioritized outgoing command queue.
+
+GUI slots put commands here and return at once; SerialProcessor's writer
+thread takes them off in priority order and writes them to the port.
+
+    SAFETY   CMD:LAND - jumps the queue and discards everything queued before
+             it (moves, and CMD:TAKEOFF which must never follow a LAND)
+    CONTROL  other CMD: commands (CMD:TAKEOFF, ...)
+    MOVE     DIR: commands - a newer direction replaces a queued one
+
+With acknowledgements enabled each command goes out as COMMAND#seq and a
+CommandTracker waits for the firmware to confirm it, either with an
+explicit $ACK,seq line in the telemetry stream or by the telemetry status
+char changing to the state the command asks for (F after CMD:TAKEOFF,
+L after CMD:LAND). Unconfirmed commands are re-sent a bounded number of
+times before they are reported as failed.
+"""
+import heapq
+import itertools
+import threading
+import time
+from latency import RollingLatency
+
+SAFETY, CONTROL, MOVE = 0, 1, 2
+SAFETY_COMMANDS = ('CMD:LAND',)
+ACK_PREFIX = '$ACK,'
+# Telemetry status char that confirms a command took effect
+EXPECTED_STATUS = {'CMD:TAKEOFF': 'F', 'CMD:LAND': 'L'}
+
+
+def priority_of(command):
+    if command in SAFETY_COMMANDS:
+        return SAFETY
+    if command.startswith('DIR:'):
+        return MOVE
+    return CONTROL
+
+
+def format_command(command, seq):
+    """Wire form of a sequence-numbered command"""
+    return f"{command}#{seq}\n"
+
+
+def parse_ack(frame):
+    """Sequence number of a $ACK,seq frame, None for anything else"""
+    if not frame.startswith(ACK_PREFIX):
+        return None
+    try:
+        return int(frame[len(ACK_PREFIX):].strip())
+    except ValueError:
+        return None
+
+
+class QueuedCommand:
+    __slots__ = ('command', 'priority', 'enqueued', 'cancelled', 'seq', 'order')
+
+    def __init__(self, command, priority, seq=None):
+        self.command = command
+        self.priority = priority
+        self.enqueued = time.perf_counter()
+        self.cancelled = False
+        self.seq = seq  # Set once sent with acknowledgements on; kept by retries
+        self.order = None  # FIFO position within its priority
+
+
+class CommandQueue:
+    """Thread-safe priority queue of commands waiting for the writer"""
+
+    def __init__(self):
+        self._heap = []
+        self._order = itertools.count()  # FIFO within a priority
+        self._pending_move = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self.coalesced = 0  # DIR: commands replaced by a newer one
+        self.preempted = 0  # Queued commands dropped for a safety command
+
+    def put(self, command, seq=None):
+        """
+        Queue a command
+        Args:
+            command (str): Command text, e.g. CMD:LAND
+            seq (int): Sequence number when re-sending an unacknowledged command
+        Returns:
+            QueuedCommand: The queued entry
+        """
+        priority = priority_of(command)
+        entry = QueuedCommand(command, priority, seq)
+        with self._cond:
+            if priority == MOVE:
+                if self._pending_move is not None:
+                    self._pending_move.cancelled = True
+                    self.coalesced += 1
+                self._pending_move = entry
+            elif priority == SAFETY:
+                # Everything else queued was issued before the LAND; sent after
+                # it (it would be, by priority) a TAKEOFF would undo the landing
+                for _, _, queued in self._heap:
+                    if queued.priority != SAFETY and not queued.cancelled:
+                        queued.cancelled = True
+                        self.preempted += 1
+                self._pending_move = None
+            entry.order = next(self._order)
+            heapq.heappush(self._heap, (priority, entry.order, entry))
+            self._cond.notify()
+        return entry
+
+    def requeue(self, entry):
+        """Put back a command the writer could not send yet, in its original place"""
+        with self._cond:
+            if entry.priority == MOVE:
+                if self._pending_move is not None:
+                    self.coalesced += 1
+                    return  # A newer direction was queued meanwhile
+                self._pending_move = entry
+            heapq.heappush(self._heap, (entry.priority, entry.order, entry))
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """
+        Next command by priority; after close() the rest are still returned
+        Returns:
+            QueuedCommand or None: None on timeout, or once closed and empty
+        """
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                while self._heap:
+                    _, _, entry = heapq.heappop(self._heap)
+                    if entry is self._pending_move:
+                        self._pending_move = None
+                    if not entry.cancelled:
+                        return entry
+                if self._closed:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def close(self):
+        """Wake the writer; it drains what is left and then stops"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def __len__(self):
+        with self._cond:
+            return sum(1 for _, _, entry in self._heap if not entry.cancelled)
+
+
+class PendingCommand:
+    __slots__ = ('command', 'seq', 'first_sent', 'last_sent', 'attempts')
+
+    def __init__(self, command, seq, now):
+        self.command = command
+        self.seq = seq
+        self.first_sent = now
+        self.last_sent = now
+        self.attempts = 0
+
+
+class CommandTracker:
+    """Commands written but not yet acknowledged, with round-trip statistics"""
+
+    def __init__(self, timeout=0.5, retries=3):
+        """
+        Args:
+            timeout (float): Seconds to wait for an acknowledgement per attempt
+            retries (int): Re-sends before a command is reported as failed
+        """
+        self.timeout = timeout
+        self.retries = retries
+        self._pending = {}  # seq -> PendingCommand
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self.rtt = RollingLatency(256)  # Send -> acknowledgement, ms
+        self.acked = 0
+        self.retried = 0
+        self.failed = 0
+
+    def next_seq(self):
+        return next(self._seq)
+
+    def sending(self, command, seq, retry=False, now=None):
+        """
+        Note that command #seq is about to be (re-)written to the port
+        (before the write, so a fast acknowledgement can't beat it)
+        Returns:
+            bool: False for a re-send whose acknowledgement already arrived
+        """
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            pending = self._pending.get(seq)
+            if pending is None:
+                if retry:
+                    return False
+                if command.startswith('DIR:'):
+                    # A new direction supersedes any move still unconfirmed
+                    for old in [p for p in self._pending.values()
+                                if p.command.startswith('DIR:')]:
+                        del self._pending[old.seq]
+                elif command in SAFETY_COMMANDS:
+                    # Nothing unconfirmed may be re-sent after a LAND either
+                    for old in [p for p in self._pending.values()
+                                if p.command not in SAFETY_COMMANDS]:
+                        del self._pending[old.seq]
+                pending = self._pending[seq] = PendingCommand(command, seq, now)
+            pending.last_sent = now
+            pending.attempts += 1
+            return True
+
+    def discard(self, seq):
+        """Stop tracking a command whose write failed"""
+        with self._lock:
+            self._pending.pop(seq, None)
+
+    def _acknowledge(self, pending, now):
+        del self._pending[pending.seq]
+        rtt_ms = (now - pending.last_sent) * 1000.0
+        if pending.attempts == 1:
+            # Only first attempts are timed: an ack after a re-send could
+            # belong to either copy
+            self.rtt.add(rtt_ms)
+        self.acked += 1
+        return pending, rtt_ms
+
+    def ack(self, seq, now=None):
+        """
+        Match an explicit acknowledgement
+        Returns:
+            list: [(PendingCommand, rtt_ms)], empty for unknown or repeated acks
+        """
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            pending = self._pending.get(seq)
+            if pending is None:
+                return []
+            return [self._acknowledge(pending, now)]
+
+    def observe_status(self, status, now=None):
+        """
+        Match commands confirmed by the telemetry status char
+        Returns:
+            list: [(PendingCommand, rtt_ms)] for every command now acknowledged
+        """
+        if not self._pending:
+            return []
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            matched = [p for p in self._pending.values()
+                       if EXPECTED_STATUS.get(p.command) == status]
+            return [self._acknowledge(p, now) for p in matched]
+
+    def expired(self, now=None):
+        """
+        Commands whose acknowledgement is overdue
+        Returns:
+            (retry, failed): PendingCommands to re-send, and ones that ran
+            out of retries (no longer tracked)
+        """
+        now = time.perf_counter() if now is None else now
+        retry, failed = [], []
+        with self._lock:
+            for pending in list(self._pending.values()):
+                if now - pending.last_sent < self.timeout:
+                    continue
+                if pending.attempts > self.retries:
+                    del self._pending[pending.seq]
+                    failed.append(pending)
+                else:
+                    pending.last_sent = now  # Don't re-queue again before it is re-sent
+                    retry.append(pending)
+            self.retried += len(retry)
+            self.failed += len(failed)
+        return retry, failed
+
+    def stats(self):
+        """Counters and round-trip percentiles (ms) of first-attempt acks"""
+        with self._lock:
+            stats = {'acked': self.acked, 'retried': self.retried,
+                     'failed': self.failed, 'pending': len(self._pending)}
+        percentiles = self.rtt.percentiles()
+        if percentiles is not None:
+            stats.update(zip(('p50', 'p95', 'p99'), percentiles))
+        return stats
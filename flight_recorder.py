@@ -0,0 +1,194 @@
+"""
+Append-only binary flight log.
+
+Every received frame is stored with its parsed fields in a fixed-size
+record, so the log can be memory-mapped and indexed directly:
+
+    header   16 bytes   magic, format version, record size
+    record   80 bytes   time, the telemetry_schema fields (int32 ints,
+                        float64 floats, one byte per char), raw frame
+                        length, raw frame (truncated to 50 bytes)
+
+FlightRecorder batches writes on its own thread; FlightLog maps a log
+read-only for zero-copy random access and time-range seeks.
+"""
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import numpy as np
+from telemetry_schema import numpy_fields, pack_values, struct_format, unpack_values
+
+FILE_MAGIC = b'SSFLOG\x00\x00'
+FORMAT_VERSION = 1
+MAX_RAW = 50
+HEADER = struct.Struct('<8sII')  # magic, version, record size
+RECORD = struct.Struct(f"<d{struct_format('i', 'd')}B{MAX_RAW}s")
+RECORD_DTYPE = np.dtype(
+    [('time', '<f8')]
+    + numpy_fields('<i4', '<f8', 'S1')
+    + [('raw_len', 'u1'), ('raw', 'u1', (MAX_RAW,))])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+
+class FlightRecorder:
+    """Writes frames to an append-only log from a background thread"""
+
+    def __init__(self, path, batch_size=256, flush_interval=0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval  # Max seconds a record waits in memory
+        self.records = 0
+        self.rejected = 0  # Frames whose values don't fit the record layout
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._file = None
+
+    def start(self):
+        """Open (or create) the log and start the writer thread"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(HEADER.pack(FILE_MAGIC, FORMAT_VERSION, RECORD.size))
+        else:
+            _read_header(self.path)  # Refuse to append to a foreign file
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def record(self, raw, values, timestamp=None):
+        """
+        Queue one frame for writing (cheap, safe from any thread)
+        Args:
+            raw (bytes or str): Frame as received
+            values (list): Parsed sample in telemetry_schema field order
+            timestamp (float): Receive time, defaults to time.time()
+        """
+        self._queue.put((timestamp if timestamp is not None else time.time(), raw, values))
+
+    def _pack(self, item):
+        timestamp, raw, values = item
+        if isinstance(raw, str):
+            raw = raw.encode('utf-8', 'replace')
+        raw = raw[:MAX_RAW]
+        return RECORD.pack(timestamp, *pack_values(values), len(raw), raw)
+
+    def _run(self):
+        running = True
+        while running:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            while True:
+                if item is None:  # Stop sentinel
+                    running = False
+                    break
+                try:
+                    batch.append(self._pack(item))
+                except (struct.error, TypeError):
+                    self.rejected += 1  # e.g. an int beyond int32: skip just this frame
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._file.write(b''.join(batch))
+                self._file.flush()
+                self.records += len(batch)
+        self._file.close()
+
+    def stop(self, timeout=2):
+        """Write out everything queued and close the log"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+
+def _read_header(path):
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"{path}: truncated flight log header")
+    magic, version, record_size = HEADER.unpack(header)
+    if magic != FILE_MAGIC or record_size != RECORD.size:
+        raise ValueError(f"{path}: not a version {FORMAT_VERSION} flight log")
+    return version
+
+
+class FlightLog:
+    """Read-only memory-mapped view of a flight log"""
+
+    def __init__(self, path):
+        _read_header(path)
+        self.path = path
+        # A partially written trailing record (e.g. after a crash) is ignored
+        count = (os.path.getsize(path) - HEADER.size) // RECORD.size
+        if count > 0:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode='r',
+                                     offset=HEADER.size, shape=(count,))
+        else:
+            self.records = np.empty(0, dtype=RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    @property
+    def start_time(self):
+        return float(self.records['time'][0]) if len(self.records) else None
+
+    @property
+    def end_time(self):
+        return float(self.records['time'][-1]) if len(self.records) else None
+
+    def index_at(self, timestamp):
+        """Index of the first record at or after timestamp"""
+        return int(np.searchsorted(self.records['time'], timestamp, side='left'))
+
+    def time_range(self, start_time, end_time):
+        """Records with start_time <= time < end_time, as a view into the map"""
+        times = self.records['time']
+        start = np.searchsorted(times, start_time, side='left')
+        end = np.searchsorted(times, end_time, side='left')
+        return self.records[start:end]
+
+    def raw_frame(self, index):
+        """Raw frame bytes as received (truncated to MAX_RAW)"""
+        record = self.records[index]
+        return record['raw'][:record['raw_len']].tobytes()
+
+    def values(self, index):
+        """Parsed fields in the same list form SerialProcessor produces"""
+        record = self.records[index].item()
+        return unpack_values(record[1:-2])  # Between the time and the raw frame
+
+    def close(self):
+        """Drop the mapping (it is released once no views remain)"""
+        self.records = np.empty(0, dtype=RECORD_DTYPE)
+
+
+def default_log_path(directory='flight_logs'):
+    """Timestamped log path for a new flight"""
+    return os.path.join(directory, time.strftime('flight_%Y%m%d_%H%M%S.bin'))
+
+
+if __name__ == "__main__":
+    for log_path in sys.argv[1:]:
+        log = FlightLog(log_path)
+        if len(log):
+            print(f"{log_path}: {len(log)} records, "
+                  f"{log.end_time - log.start_time:.1f} s, "
+                  f"max height {log.records['height'].max()}")
+        else:
+            print(f"{log_path}: empty")
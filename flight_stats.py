@@ -0,0 +1,333 @@
+"""
+Offline per-flight statistics over many logs.
+
+    python flight_stats.py flight_logs/ --json report.json --csv report.csv
+
+Accepts FlightRecorder .bin logs and text dumps of $... lines (parsed with
+bulk_parser), as files or directories. Every log is cut into segments and a
+process pool summarizes them independently; FlightSummary objects merge in
+log order, so a flight's numbers don't depend on how it was split:
+
+    max height, speed percentiles (exact, from an integer histogram),
+    tilt beyond the TiltGauge +/-45 deg clamp (packets, excursions, peak),
+    status char transitions, and the share of lines or log records that
+    were not frames (zeroed, torn or garbled records in .bin logs).
+
+Directories contribute .bin flight logs (recognised by their magic) and
+text dumps named *.txt or *.log, so reports written next to the logs are
+not read back in.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import bulk_parser
+from flight_recorder import FILE_MAGIC, HEADER, MAX_RAW, RECORD, FlightLog
+from telemetry_schema import FIELDS, FIELD_BY_NAME
+
+TILT_LIMIT = FIELD_BY_NAME['tilt'].maximum  # TiltGauge clamps its needle here
+SPEED_PERCENTILES = (50, 90, 99)
+SEGMENT_BYTES = 8 * 1024 * 1024  # Text dump slice per task
+SEGMENT_RECORDS = 250000         # Binary log records per task
+TEXT_EXTENSIONS = ('.txt', '.log')  # Text dumps picked up from directories
+CSV_COLUMNS = ('flight', 'packets', 'errors', 'error_rate', 'duration_s', 'max_height',
+               'speed_p50', 'speed_p90', 'speed_p99', 'max_abs_tilt',
+               'tilt_packets_over', 'tilt_excursions', 'status_transitions')
+
+
+class FlightSummary:
+    """Mergeable statistics of a contiguous run of packets"""
+
+    def __init__(self):
+        self.packets = 0
+        self.errors = 0          # Lines or records that were not valid frames
+        self.max_height = None
+        self.speeds = {}         # speed -> packet count
+        self.max_abs_tilt = None
+        self.tilt_over = 0       # Packets beyond TILT_LIMIT
+        self.tilt_excursions = 0  # Runs of consecutive packets beyond it
+        self.transitions = {}    # 'F>L' -> count
+        self.start_time = None
+        self.end_time = None
+        # Segment edges, so merging can stitch runs and transitions together
+        self.first_status = self.last_status = None
+        self.first_over = self.last_over = False
+
+    def add_columns(self, height, speed, tilt, status, times=None, errors=0):
+        """
+        Summarize consecutive packets
+        Args:
+            height, speed, tilt (array): Integer columns
+            status (array): Status chars as integer code points, 0 for none
+            times (array): Receive times, if the log has them
+            errors (int): Rejected lines among them
+        """
+        segment = FlightSummary()
+        segment.errors = errors
+        segment.packets = len(height)
+        if segment.packets:
+            segment.max_height = int(height.max())
+            values, counts = np.unique(speed, return_counts=True)
+            segment.speeds = dict(zip(values.tolist(), counts.tolist()))
+            magnitude = np.abs(tilt)
+            segment.max_abs_tilt = int(magnitude.max())
+            over = magnitude > TILT_LIMIT
+            segment.tilt_over = int(over.sum())
+            segment.tilt_excursions = int(over[0]) + int((over[1:] & ~over[:-1]).sum())
+            segment.first_over, segment.last_over = bool(over[0]), bool(over[-1])
+            status = status[status != 0]
+            if len(status):
+                segment.first_status, segment.last_status = chr(status[0]), chr(status[-1])
+                changed = status[1:] != status[:-1]
+                pairs = status[:-1][changed].astype(np.int64) << 21 | status[1:][changed]
+                keys, counts = np.unique(pairs, return_counts=True)
+                segment.transitions = {f"{chr(key >> 21)}>{chr(key & 0x1FFFFF)}": count
+                                       for key, count in zip(keys.tolist(), counts.tolist())}
+            if times is not None:
+                segment.start_time, segment.end_time = float(times[0]), float(times[-1])
+        return self.merge(segment)
+
+    def merge(self, other, contiguous=True):
+        """
+        Add another summary's packets to these
+        Args:
+            contiguous (bool): other's packets came right after these (a later
+                segment of the same flight), so runs and transitions continue
+        Returns:
+            FlightSummary: self
+        """
+        if contiguous and self.last_over and other.first_over:
+            self.tilt_excursions -= 1  # One excursion spanning the cut
+        if (contiguous and self.last_status and other.first_status
+                and self.last_status != other.first_status):
+            key = f"{self.last_status}>{other.first_status}"
+            self.transitions[key] = self.transitions.get(key, 0) + 1
+        for key, count in other.transitions.items():
+            self.transitions[key] = self.transitions.get(key, 0) + count
+        for speed, count in other.speeds.items():
+            self.speeds[speed] = self.speeds.get(speed, 0) + count
+        if other.packets:
+            if not self.packets:
+                self.first_over = other.first_over
+            self.last_over = other.last_over
+        if other.first_status is not None:
+            if self.first_status is None:
+                self.first_status = other.first_status
+            self.last_status = other.last_status
+        self.packets += other.packets
+        self.errors += other.errors
+        self.tilt_over += other.tilt_over
+        self.tilt_excursions += other.tilt_excursions
+        self.max_height = _max(self.max_height, other.max_height)
+        self.max_abs_tilt = _max(self.max_abs_tilt, other.max_abs_tilt)
+        if other.start_time is not None:
+            self.start_time = _min(self.start_time, other.start_time)
+            self.end_time = _max(self.end_time, other.end_time)
+        return self
+
+    def speed_percentiles(self, percentiles=SPEED_PERCENTILES):
+        """Nearest-rank percentiles of speed, None without packets"""
+        if not self.speeds:
+            return None
+        values = sorted(self.speeds)
+        cumulative = np.cumsum([self.speeds[v] for v in values])
+        ranks = [max(1, int(np.ceil(p / 100.0 * cumulative[-1]))) for p in percentiles]
+        return [values[int(np.searchsorted(cumulative, rank))] for rank in ranks]
+
+    @property
+    def error_rate(self):
+        lines = self.packets + self.errors
+        return self.errors / lines if lines else 0.0
+
+    def report(self):
+        """Plain dict for the JSON and CSV output"""
+        percentiles = self.speed_percentiles() or [None] * len(SPEED_PERCENTILES)
+        report = {'packets': self.packets, 'errors': self.errors,
+                  'error_rate': round(self.error_rate, 6),
+                  'duration_s': (None if self.start_time is None
+                                 else round(self.end_time - self.start_time, 3)),
+                  'max_height': self.max_height}
+        report.update((f"speed_p{p}", value) for p, value in zip(SPEED_PERCENTILES, percentiles))
+        report.update(max_abs_tilt=self.max_abs_tilt, tilt_packets_over=self.tilt_over,
+                      tilt_excursions=self.tilt_excursions,
+                      status_transitions=dict(sorted(self.transitions.items())))
+        return report
+
+
+def _max(a, b):
+    return b if a is None else a if b is None else max(a, b)
+
+
+def _min(a, b):
+    return b if a is None else a if b is None else min(a, b)
+
+
+def is_binary_log(path):
+    with open(path, 'rb') as f:
+        return f.read(len(FILE_MAGIC)) == FILE_MAGIC
+
+
+def valid_records(records):
+    """
+    Mask of binary log records holding a frame; a crash or a bad disk leaves
+    zeroed or garbled records (no receive time, impossible raw length or char)
+    """
+    times = records['time']
+    good = np.isfinite(times) & (times > 0)
+    good &= (records['raw_len'] > 0) & (records['raw_len'] <= MAX_RAW)
+    for field in FIELDS:
+        if field.kind == 'char':
+            good &= records[field.name].view(np.uint8) < 0x80  # pack_values writes ASCII
+    return good
+
+
+def log_segments(path):
+    """
+    Split a log into independent tasks
+    Returns:
+        list: (path, kind, start, end) in log order; bytes for text dumps,
+        record indices for binary logs
+    """
+    if is_binary_log(path):
+        count = max(0, (os.path.getsize(path) - HEADER.size) // RECORD.size)
+        return [(path, 'binary', start, min(count, start + SEGMENT_RECORDS))
+                for start in range(0, count, SEGMENT_RECORDS)]
+    size = os.path.getsize(path)
+    return [(path, 'text', start, min(size, start + SEGMENT_BYTES))
+            for start in range(0, size, SEGMENT_BYTES)]
+
+
+def _read_lines(path, start, end):
+    """The lines that start inside [start, end) of a text dump"""
+    with open(path, 'rb') as f:
+        if start > 0:
+            f.seek(start - 1)
+            f.readline()  # The line in progress belongs to the previous segment
+        else:
+            f.seek(0)
+        offset = f.tell()
+        if offset >= end:
+            return b''
+        data = f.read(end - offset)
+        if not data.endswith(b'\n'):
+            data += f.readline()
+        return data
+
+
+def summarize_segment(task):
+    """Process pool worker: summary of one segment"""
+    path, kind, start, end = task
+    summary = FlightSummary()
+    if kind == 'binary':
+        log = FlightLog(path)
+        records = log.records[start:end]
+        good = valid_records(records)
+        errors = len(records) - int(good.sum())
+        if errors:
+            records = records[good]
+        if end == len(log) and (os.path.getsize(path) - HEADER.size) % RECORD.size:
+            errors += 1  # Torn last record
+        summary.add_columns(records['height'], records['speed'], records['tilt'],
+                            records['status'].view(np.uint8).astype(np.uint32),
+                            times=records['time'], errors=errors)
+        del records
+        log.close()
+    else:
+        batch = bulk_parser.parse_buffer(_read_lines(path, start, end))
+        columns = batch.columns
+        summary.add_columns(columns['height'], columns['speed'], columns['tilt'],
+                            columns['status'].view(np.uint32),  # '' is code point 0
+                            errors=len(batch.bad_lines))
+    return summary
+
+
+def find_logs(paths):
+    """Files named on the command line, plus the logs under named directories"""
+    logs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    log = os.path.join(root, name)
+                    if not name.startswith('.') and (name.lower().endswith(TEXT_EXTENSIONS)
+                                                     or is_binary_log(log)):
+                        logs.append(log)
+        else:
+            logs.append(path)
+    return logs
+
+
+def analyze(paths, jobs=None):
+    """
+    Summarize every log on a process pool
+    Returns:
+        (flights, total): {path: FlightSummary} in input order, and all merged
+    """
+    tasks = [task for path in paths for task in log_segments(path)]
+    flights = {path: FlightSummary() for path in paths}
+    if jobs == 1:
+        results = map(summarize_segment, tasks)
+        for task, summary in zip(tasks, results):
+            flights[task[0]].merge(summary)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for task, summary in zip(tasks, pool.map(summarize_segment, tasks)):
+                flights[task[0]].merge(summary)
+    total = FlightSummary()
+    for summary in flights.values():
+        total.merge(summary, contiguous=False)
+    return flights, total
+
+
+def write_csv(path, flights, total):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for name, summary in list(flights.items()) + [('TOTAL', total)]:
+            report = summary.report()
+            report['flight'] = name
+            report['status_transitions'] = ';'.join(
+                f"{key}:{count}" for key, count in report['status_transitions'].items())
+            writer.writerow(['' if report[column] is None else report[column]
+                             for column in CSV_COLUMNS])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-flight statistics over telemetry logs")
+    parser.add_argument('paths', nargs='+', help="log files or directories of logs")
+    parser.add_argument('--json', metavar='PATH', help="write the report as JSON")
+    parser.add_argument('--csv', metavar='PATH', help="write one row per flight as CSV")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="worker processes (default: one per CPU, 1 runs inline)")
+    args = parser.parse_args(argv)
+
+    logs = find_logs(args.paths)
+    if not logs:
+        parser.error("no logs found")
+    t0 = time.perf_counter()
+    flights, total = analyze(logs, args.jobs)
+    elapsed = time.perf_counter() - t0
+
+    for name, summary in list(flights.items()) + [('TOTAL', total)]:
+        report = summary.report()
+        print(f"{name}: {report['packets']} packets, "
+              f"{report['error_rate'] * 100:.2f}% errors, max height {report['max_height']}, "
+              f"speed p50/p90/p99 {report['speed_p50']}/{report['speed_p90']}/"
+              f"{report['speed_p99']}, {report['tilt_excursions']} tilt excursions "
+              f"beyond {TILT_LIMIT} deg")
+    print(f"{len(logs)} logs, {total.packets} packets in {elapsed:.2f} s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'flights': {name: summary.report() for name, summary in flights.items()},
+                       'total': total.report()}, f, indent=2)
+    if args.csv:
+        write_csv(args.csv, flights, total)
+    return flights, total
+
+
+if __name__ == "__main__":
+    main()
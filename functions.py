@@ -1,18 +1,32 @@
 import os
 import serial
-import serial.tools.list_ports
 import threading
 import time
 import math
+import json
+import hashlib
 from PyQt5.QtCore import (QObject, pyqtSignal, pyqtSlot, Qt, 
                          QPoint, QTimer, QRect)
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
                            QGroupBox, QFormLayout, QPushButton, QFrame,
                            QProgressBar, QDial)
 from PyQt5.QtGui import (QPainter, QColor, QPen, QPolygon, QFont,
-                        QLinearGradient)
+                        QLinearGradient, QPixmap)
+from binary_frames import BinaryFrameDecoder
+from telemetry_history import TelemetryHistory
+from track import TrackSimplifier
+from command_queue import SAFETY, CommandQueue, format_command, parse_ack, priority_of
+from latency import RollingLatency
+from link_supervisor import LinkSupervisor
+from telemetry_schema import (FIELDS, FIELD_BY_NAME, FIELD_INDEX, FRAME_START,
+                              default_values, parse_frame)
+
+HEIGHT, SPEED, TILT, STATUS = (FIELD_INDEX[name] for name in ('height', 'speed', 'tilt', 'status'))
+FRAME_MARKER = FRAME_START.encode()
 
 class VerticalGauge(QFrame):
+    VISIBLE_SPAN = 30  # Units shown at once, the current value in the middle
+    
     def __init__(self, title, min_val, max_val, unit):
         super().__init__()
         self.title = title
@@ -22,41 +36,73 @@ class VerticalGauge(QFrame):
         self.value = min_val
         self.setFixedSize(100, 100)  # Reduced size
         self.setStyleSheet("background-color: #111; border-radius: 5px;")
+        self._scale_font = QFont('Arial', 8)
+        self._value_font = QFont('Arial', 10, QFont.Bold)
+        self._strip = None  # Whole scale, drawn once per size and scrolled
+        self.paint_callback = None  # Called after each repaint (latency tracking)
 
     def set_value(self, value):
         self.value = value  # Don't clamp the value to min/max to allow scrolling
         self.update()
 
-    def paintEvent(self, event):
-        painter = QPainter(self)
+    def resizeEvent(self, event):
+        self._strip = None
+        super().resizeEvent(event)
+
+    def _pixels_per_unit(self):
+        return self.height() / self.VISIBLE_SPAN
+
+    def _render_strip(self, ratio):
+        """Pre-render every tick and label from min_val to max_val in one tall strip"""
+        scale = self._pixels_per_unit()
+        margin = self.VISIBLE_SPAN / 2  # Room to scroll either end to the middle
+        pixmap = QPixmap(int(self.width() * ratio),
+                         int(((self.max_val - self.min_val) + 2 * margin) * scale * ratio) + 1)
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
         painter.setRenderHint(QPainter.Antialiasing)
         
-        # Calculate visible range based on current value
-        visible_min = max(self.min_val, self.value - 15)  # Show 15 units below current
-        visible_max = min(self.max_val, self.value + 15)  # Show 15 units above current
-        visible_range = visible_max - visible_min
-        
         # Draw scale
         painter.setPen(QPen(Qt.white, 2))
-        painter.setFont(QFont('Arial', 8))
+        painter.setFont(self._scale_font)
         
-        for i in range(int(visible_min), int(visible_max) + 1, 2):
-            y_pos = int(self.height() - ((i - visible_min) * (self.height()/visible_range)))
+        top = self.max_val + margin  # Value at the top edge of the strip
+        for i in range(int(self.min_val), int(self.max_val) + 1, 2):
+            y_pos = int((top - i) * scale)
             if i % 5 == 0:  # Major markings
                 painter.drawLine(25, y_pos, 50, y_pos)
                 painter.drawText(55, y_pos + 5, f"{i}{self.unit}")
             else:  # Minor markings
                 painter.drawLine(35, y_pos, 50, y_pos)
+        painter.end()
+        return pixmap
+
+    def paintEvent(self, event):
+        ratio = self.devicePixelRatioF()
+        if self._strip is None or self._strip.devicePixelRatioF() != ratio:
+            self._strip = self._render_strip(ratio)
         
-        # Draw needle at current value (centered)
+        # Scroll the strip so the current value sits at the needle
         needle_pos = int(self.height()/2)  # Always center the current value
+        top = self.max_val + self.VISIBLE_SPAN / 2
+        offset = needle_pos - (top - self.value) * self._pixels_per_unit()
+        painter = QPainter(self)
+        painter.setClipRect(self.rect())
+        if abs(offset) < self._strip.height() + self.height():  # Far off scale: nothing to show
+            painter.drawPixmap(0, int(offset), self._strip)
+        
+        # Draw needle at current value (centered)
+        painter.setRenderHint(QPainter.Antialiasing)
         painter.setPen(QPen(Qt.red, 3))
         painter.drawLine(10, needle_pos, 25, needle_pos)
         
         # Draw current value at bottom
         painter.setPen(Qt.white)
-        painter.setFont(QFont('Arial', 10, QFont.Bold))
+        painter.setFont(self._value_font)
         painter.drawText(10, self.height()-5, f"{self.value:.1f}{self.unit}")
+        if self.paint_callback is not None:
+            self.paint_callback()
 
 class TiltGauge(QFrame):
     def __init__(self):
@@ -64,19 +110,33 @@ class TiltGauge(QFrame):
         self.setFixedSize(350, 180)  # Wider and shorter
         self.angle = 0
         self.setStyleSheet("background-color: #111; border-radius: 5px;")
+        self._scale_font = QFont('Arial', 8)
+        self._value_font = QFont('Arial', 10, QFont.Bold)
+        self._background = None  # Arc, tick marks and labels, drawn once
+        self.paint_callback = None  # Called after each repaint (latency tracking)
 
     def set_angle(self, angle):
         self.angle = max(-45, min(45, angle))
         self.update()
 
-    def paintEvent(self, event):
-        painter = QPainter(self)
+    def resizeEvent(self, event):
+        self._background = None
+        super().resizeEvent(event)
+
+    def _geometry(self):
+        """Center point and radius of the arc"""
+        return self.width() / 2, self.height() - 20, 150
+
+    def _render_background(self, ratio):
+        """Pre-render everything except the needle and the value text"""
+        pixmap = QPixmap(int(self.width() * ratio), int(self.height() * ratio))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
         painter.setRenderHint(QPainter.Antialiasing)
         
         # Draw arc background (-45 to +45 degrees)
-        center_x = self.width() / 2
-        center_y = self.height() - 20
-        radius = 150
+        center_x, center_y, radius = self._geometry()
         
         # Draw the arc
         painter.setPen(QPen(Qt.white, 2))
@@ -85,7 +145,7 @@ class TiltGauge(QFrame):
                        135 * 16, 270 * 16)  # 135° to 405° (270° span)
         
         # Draw angle markings
-        painter.setFont(QFont('Arial', 8))
+        painter.setFont(self._scale_font)
         for angle in range(-40, 41, 10):  # Every 10 degrees from -40 to +40
             rad = math.radians(angle)
             x1 = int(center_x + (radius-5) * math.sin(rad))
@@ -104,6 +164,21 @@ class TiltGauge(QFrame):
         painter.drawLine(int(center_x - radius), int(center_y), 
                          int(center_x + radius), int(center_y))
         
+        painter.setFont(self._value_font)
+        painter.drawText(10, 15, "TILT")
+        painter.end()
+        return pixmap
+
+    def paintEvent(self, event):
+        ratio = self.devicePixelRatioF()
+        if self._background is None or self._background.devicePixelRatioF() != ratio:
+            self._background = self._render_background(ratio)
+        
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self._background)
+        painter.setRenderHint(QPainter.Antialiasing)
+        center_x, center_y, radius = self._geometry()
+        
         # Draw needle
         rad = math.radians(self.angle)
         x_end = int(center_x + (radius-10) * math.sin(rad))
@@ -113,17 +188,21 @@ class TiltGauge(QFrame):
         
         # Draw current angle value
         painter.setPen(Qt.white)
-        painter.setFont(QFont('Arial', 10, QFont.Bold))
-        painter.drawText(10, 15, "TILT")
+        painter.setFont(self._value_font)
         painter.drawText(int(center_x - 20), 20, f"{self.angle:.1f}°")
+        if self.paint_callback is not None:
+            self.paint_callback()
 
 
 class DataDisplay(QWidget):
     def __init__(self):
         super().__init__()
-        self.value_names = ["Sensor 1", "Sensor 2", "Sensor 3", "Value", "Status"]
-        self.value_units = ["", "", "", "", ""]
+        self.value_names = [field.label for field in FIELDS]
+        self.value_units = [field.unit for field in FIELDS]
         self.flight_status = 0  # 0 = Not flying (landed), 1 = Flying (in air)
+        self.latency = None  # Optional latency.LatencyTracker
+        self._paint_arrival = None  # Arrival time of the sample awaiting repaint
+        self._status_message = "System initialized"
         self.init_ui()
 
     def init_ui(self):
@@ -196,8 +275,8 @@ class DataDisplay(QWidget):
         data_layout = QFormLayout()
         
         self.value_labels = []
-        for i in range(5):
-            label = QLabel("0" + self.value_units[i])
+        for i, field in enumerate(FIELDS):
+            label = QLabel(field.format(field.default))
             label.setAlignment(Qt.AlignCenter)
             label.setStyleSheet("""
                 QLabel {
@@ -223,8 +302,8 @@ class DataDisplay(QWidget):
         
         # Height and Speed in a row
         h_gauges = QHBoxLayout()
-        self.height_gauge = VerticalGauge("HEIGHT", 0, 30, "m")  # Reduced range
-        self.speed_gauge = VerticalGauge("SPEED", 0, 10, "m/s")  # Reduced range
+        self.height_gauge = self._field_gauge(FIELD_BY_NAME['height'])
+        self.speed_gauge = self._field_gauge(FIELD_BY_NAME['speed'])
         h_gauges.addWidget(self.height_gauge)
         h_gauges.addWidget(self.speed_gauge)
         instruments_layout.addLayout(h_gauges)
@@ -239,30 +318,57 @@ class DataDisplay(QWidget):
         # Status Bar
         self.status_label = QLabel("System initialized")
         self.status_label.setStyleSheet("color: #aaa; font-style: italic;")
+        self.status_label.setWordWrap(True)  # Room for the latency summary
         layout.addWidget(self.status_label)
         
         self.setLayout(layout)
         self.setFixedWidth(400)
 
+    @staticmethod
+    def _field_gauge(field):
+        """Vertical gauge spanning a schema field's range"""
+        return VerticalGauge(field.label.upper(), field.minimum, field.maximum, field.unit)
+
     def update_values(self, values):
         """Update both the numeric displays and gauges"""
         # Update sensor values
-        for i in range(min(5, len(values))):
-            if i == 3:  # Float value
-                self.value_labels[i].setText(f"{values[i]:.1f}{self.value_units[i]}")
-            else:
-                self.value_labels[i].setText(f"{values[i]}{self.value_units[i]}")
+        for label, field, value in zip(self.value_labels, FIELDS, values):
+            label.setText(field.format(value))
         
         # Update gauges
-        if len(values) > 0:
-            self.height_gauge.set_value(values[0])
-        if len(values) > 1:
-            self.speed_gauge.set_value(values[1])
-        if len(values) > 2:
-            self.tilt_gauge.set_angle(values[2])
+        self.height_gauge.set_value(values[HEIGHT])
+        self.speed_gauge.set_value(values[SPEED])
+        self.tilt_gauge.set_angle(values[TILT])
+
+    def set_latency_tracker(self, tracker, interval_ms=1000):
+        """Record update/paint latency and show a summary in the status label"""
+        self.latency = tracker
+        for gauge in (self.height_gauge, self.speed_gauge, self.tilt_gauge):
+            gauge.paint_callback = self._gauge_painted
+        self._latency_timer = QTimer(self)
+        self._latency_timer.timeout.connect(self._refresh_status)
+        self._latency_timer.start(interval_ms)
+
+    def record_update(self, arrival):
+        """Note that the sample read at `arrival` is now on the widgets"""
+        if self.latency is not None and arrival is not None:
+            self.latency.record('update', arrival)
+            self._paint_arrival = arrival
+
+    def _gauge_painted(self):
+        if self._paint_arrival is not None:
+            self.latency.record('paint', self._paint_arrival)
+            self._paint_arrival = None
+
+    def _refresh_status(self):
+        text = self._status_message
+        if self.latency is not None:
+            text += "\n" + self.latency.summary_text()
+        self.status_label.setText(text)
 
     def update_status(self, message):
-        self.status_label.setText(message)
+        self._status_message = message
+        self._refresh_status()
         
     def update_flight_status(self, status):
         """Update flight status display (0 = landed, 1 = flying)"""
@@ -294,13 +400,166 @@ class DataDisplay(QWidget):
                 }
             """)
 
+class DisplayUpdater(QObject):
+    """
+    Coalesces telemetry between SerialProcessor and DataDisplay.
+    The reader thread only stores the newest sample; a GUI-thread timer
+    pushes it to the widgets at refresh_hz, so the event queue never
+    fills up with stale per-packet updates.
+    """
+    frame_shown = pyqtSignal(int)  # Number of samples folded into the frame
+    
+    def __init__(self, display, refresh_hz=30):
+        super().__init__()
+        self.display = display
+        self._lock = threading.Lock()
+        self._latest = None
+        self._arrival = None
+        self._pending = 0
+        self.frames = 0        # Frames pushed to the widgets
+        self.samples = 0       # Samples received
+        self.last_folded = 0   # Samples behind the most recent frame
+        self.max_folded = 0
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self.flush)
+        self.set_refresh_rate(refresh_hz)
+
+    def set_refresh_rate(self, refresh_hz):
+        """Change the widget refresh rate (Hz)"""
+        self.refresh_hz = refresh_hz
+        self._timer.setInterval(max(1, int(round(1000 / refresh_hz))))
+
+    def start(self):
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+
+    def submit(self, values, arrival=None):
+        """
+        Store the newest sample (safe to call from the reader thread)
+        Args:
+            values (list): Parsed sample
+            arrival (float): perf_counter() when its bytes were read, if known
+        """
+        with self._lock:
+            self._latest = values
+            self._arrival = arrival
+            self._pending += 1
+
+    def flush(self):
+        """Push the newest sample to the display, if one arrived since last frame"""
+        with self._lock:
+            values, arrival, folded = self._latest, self._arrival, self._pending
+            self._latest = None
+            self._pending = 0
+        if values is None:
+            return
+        
+        self.display.update_values(values)
+        self.display.record_update(arrival)
+        self.frames += 1
+        self.samples += folded
+        self.last_folded = folded
+        self.max_folded = max(self.max_folded, folded)
+        self.frame_shown.emit(folded)
+
+class PositionFeed(QObject):
+    """
+    Python -> JS feed of the drone position and flight track.
+    Register it on the page's QWebChannel as 'positionFeed'. Positions can be
+    pushed from any thread; a GUI-thread timer sends at most one
+    track_update per refresh with the newest position and only the track
+    vertices that changed since the last one.
+    """
+    # JSON: {"pos": [lat, lon], "from": index, "points": [[lat, lon], ...]}
+    # The map replaces its track from `index` onwards with `points`.
+    track_update = pyqtSignal(str)
+
+    def __init__(self, refresh_hz=30, tolerance_m=3.0, parent=None):
+        super().__init__(parent)
+        self.track = TrackSimplifier(tolerance_m)
+        self._lock = threading.Lock()
+        self._position = None
+        self._changed_from = None
+        self.updates = 0  # track_update signals sent
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.flush)
+        self._timer.setInterval(max(1, int(round(1000 / refresh_hz))))
+
+    def start(self):
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+
+    def push_position(self, lat, lon):
+        """Record a position fix (safe to call from any thread)"""
+        with self._lock:
+            self._position = (float(lat), float(lon))
+            changed = self.track.add(lat, lon)
+            if changed is not None and (self._changed_from is None or
+                                        changed < self._changed_from):
+                self._changed_from = changed
+
+    def clear_track(self):
+        with self._lock:
+            self.track.clear()
+            self._changed_from = 0
+
+    def flush(self):
+        """Send the pending position and track changes, if any"""
+        with self._lock:
+            position, start = self._position, self._changed_from
+            if position is None and start is None:
+                return
+            self._position = None
+            self._changed_from = None
+            points = self.track.vertices[start:] if start is not None else []
+        self.track_update.emit(json.dumps({
+            'pos': position, 'from': start, 'points': points}))
+        self.updates += 1
+
+    @pyqtSlot(result=str)
+    def snapshot(self):
+        """Whole track and last position, for a page that (re)connects"""
+        with self._lock:
+            vertices = list(self.track.vertices)
+        return json.dumps({'pos': vertices[-1] if vertices else None,
+                           'from': 0, 'points': vertices})
+
 class MapLoader(QObject):
+    """
+    Builds the map page from its template. Use html() to load it straight
+    from memory, or run() to write it to a cache file that is only rewritten
+    when the rendered page changes.
+    """
     map_ready = pyqtSignal(str)
     status_update = pyqtSignal(str)
     
-    def __init__(self):
+    # Fixed center coordinates (your known location)
+    INITIAL_CENTER = (28.402236, 76.988318)
+    INITIAL_ZOOM = 15
+    # Range rings around the center: (radius in metres, label)
+    CIRCLES = ((4000, 'Fourth Circle'), (3000, 'Third Circle'),
+               (2000, 'Second Circle'), (1000, 'First Circle'))
+    
+    def __init__(self, tile_url='tiles/{z}/{x}/{y}.png', center=None, zoom=None,
+                 circles=None, cache_path='map.html'):
+        """
+        Args:
+            tile_url (str): Leaflet tile URL template (files or the tiles: scheme)
+            center (tuple): (lat, lon) of the initial view, INITIAL_CENTER by default
+            zoom (int): Initial zoom, INITIAL_ZOOM by default
+            circles (list): (radius_m, label) range rings, CIRCLES by default
+            cache_path (str): Where run() keeps the rendered page
+        """
         super().__init__()
-        self._running = True
+        self.center = tuple(center) if center is not None else self.INITIAL_CENTER
+        self.zoom = zoom if zoom is not None else self.INITIAL_ZOOM
+        self.circles = circles if circles is not None else self.CIRCLES
+        self.cache_path = cache_path
         self._html_content = """
         <!DOCTYPE html>
         <html>
@@ -310,6 +569,7 @@ class MapLoader(QObject):
             <meta name="viewport" content="width=device-width, initial-scale=1.0">
             <link rel="stylesheet" href="leaflet.css" />
             <script src="leaflet.js"></script>
+            <script src="qrc:///qtwebchannel/qwebchannel.js"></script>
             <style>
                 #controls {
                     position: absolute;
@@ -374,15 +634,14 @@ class MapLoader(QObject):
             <div id="directionPopup"></div>
             <script>
                 // Fixed center coordinates (your known location)
-                var initialCenter = [28.402236, 76.988318];
-                var initialZoom = 15;
+                var initialCenter = [__CENTER__];
+                var initialZoom = __ZOOM__;
                 var resetTimer;
                 
                 var map = L.map('map').setView(initialCenter, initialZoom);
                 
                 // Use local tiles instead of online tiles
-                // Assuming tiles are in a 'tiles' subdirectory
-                L.tileLayer('tiles/{z}/{x}/{y}.png', {
+                L.tileLayer('__TILE_URL__', {
                     maxZoom: 18,
                     minZoom: 12,
                     attribution: 'Map data © OpenStreetMap contributors',
@@ -392,12 +651,7 @@ class MapLoader(QObject):
                 // Add enemy marker
                 L.marker([28.3968, 77.0233]).addTo(map).bindPopup("<h2>Enemy</h2>");
                 
-                var circles = [
-                    { radius: 4000, label: 'Fourth Circle' },
-                    { radius: 3000, label: 'Third Circle' },
-                    { radius: 2000, label: 'Second Circle' },
-                    { radius: 1000, label: 'First Circle' }
-                ];
+                var circles = __CIRCLES__;
                 
                 function addCircles() {
                     circles.forEach(function(circle) {
@@ -417,7 +671,6 @@ class MapLoader(QObject):
                 
                 function resetMapView() {
                     map.setView(initialCenter, initialZoom);
-                    addCircles();
                 }
                 
                 function scheduleReset() {
@@ -460,106 +713,437 @@ class MapLoader(QObject):
                 map.on('moveend', scheduleReset);
                 map.on('zoomend', scheduleReset);
                 map.on('click', scheduleReset);
+                
+                // Live drone position and simplified flight track
+                var droneMarker = null;
+                var trackPoints = [];
+                var trackLine = L.polyline([], { color: 'red', weight: 2 }).addTo(map);
+                
+                function applyTrackUpdate(json) {
+                    var update = JSON.parse(json);
+                    if (update.from !== null) {
+                        trackPoints.splice(update.from, trackPoints.length - update.from);
+                        Array.prototype.push.apply(trackPoints, update.points);
+                        trackLine.setLatLngs(trackPoints);
+                    }
+                    if (update.pos) {
+                        if (droneMarker) {
+                            droneMarker.setLatLng(update.pos);
+                        } else {
+                            droneMarker = L.circleMarker(update.pos, {
+                                radius: 6, color: 'white', weight: 2,
+                                fillColor: 'red', fillOpacity: 1
+                            }).addTo(map).bindPopup("<h2>Drone</h2>");
+                        }
+                    }
+                }
+                
+                if (typeof QWebChannel !== 'undefined') {
+                    new QWebChannel(qt.webChannelTransport, function(channel) {
+                        window.pyQtBridge = channel.objects.pyQtBridge;
+                        var feed = channel.objects.positionFeed;
+                        if (feed) {
+                            feed.snapshot(applyTrackUpdate);
+                            feed.track_update.connect(applyTrackUpdate);
+                        }
+                    });
+                }
             </script>
         </body>
         </html>
+        """.replace('__TILE_URL__', tile_url).replace(
+            '__CENTER__', f"{self.center[0]}, {self.center[1]}").replace(
+            '__ZOOM__', str(self.zoom)).replace(
+            '__CIRCLES__', json.dumps([{'radius': radius, 'label': label}
+                                       for radius, label in self.circles]))
+        self.digest = hashlib.sha1(self._html_content.encode('utf-8')).hexdigest()
+
+    def html(self):
+        """The rendered page, for QWebEngineView.setHtml()"""
+        return self._html_content
+
+    def write_cache(self):
+        """
+        Write the page to cache_path unless it already holds this version
+        Returns:
+            bool: True if the file was (re)written
         """
+        marker = f"<!-- map-template {self.digest} -->\n"
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                if f.readline() == marker:
+                    return False
+        except OSError:
+            pass  # No cache yet
+        temp_path = self.cache_path + ".part"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(marker + self._html_content)
+        os.replace(temp_path, self.cache_path)
+        return True
 
     def run(self):
-        """Threaded map loading"""
-        self.status_update.emit("Loading map...")
+        """Make sure the cached page is current and announce it (returns at once)"""
         try:
-            file_path = os.path.abspath("map.html")
-            with open(file_path, "w") as f:
-                f.write(self._html_content)
-            self.map_ready.emit(file_path)
-            self.status_update.emit("Map loaded successfully")
-            
-            while self._running:
-                time.sleep(0.1)
+            written = self.write_cache()
+            self.map_ready.emit(os.path.abspath(self.cache_path))
+            self.status_update.emit("Map loaded" if written else "Map loaded from cache")
         except Exception as e:
             self.status_update.emit(f"Map error: {str(e)}")
 
-    def stop(self):
-        self._running = False
+def split_frames(buffer, max_frame_size=256):
+    """
+    Pop every complete line out of buffer, leaving any partial frame behind
+    Args:
+        buffer (bytearray): Receive buffer, consumed in place
+        max_frame_size (int): Drop the buffer if no newline shows up within this
+    Returns:
+        list: Decoded frames, each starting at its '$' marker
+    """
+    end = buffer.rfind(b'\n')
+    if end < 0:
+        if len(buffer) > max_frame_size:
+            buffer.clear()  # Line noise with no terminator, start over
+        return []
+    lines = buffer[:end].split(b'\n')
+    del buffer[:end + 1]
+    
+    frames = []
+    for line in lines:
+        start = line.find(FRAME_MARKER)  # Resync past any garbage before the marker
+        if start >= 0:
+            frames.append(line[start:].decode('utf-8', 'replace').strip())
+    return frames
 
 class SerialProcessor(QObject):
     data_processed = pyqtSignal(list)
     status_update = pyqtSignal(str)
+    command_acked = pyqtSignal(str, float)  # Command, round trip in ms
+    command_failed = pyqtSignal(str)        # Command never acknowledged
     
-    def __init__(self):
+    def __init__(self, port=None, connection=None):
+        """
+        Args:
+            port (str): Device or pyserial URL to open; auto-detected when None
+            connection: Already open serial object to read instead (e.g. loop://)
+        """
         super().__init__()
         self._running = True
-        self.port = None
+        self.port = port
         self.baudrate = 57600
-        self.serial_conn = None
-        self.current_values = [0, 0, 0, 0.0, '']  # int1, int2, int3, float_val, char_val
-
-    def find_arduino_port(self):
-        ports = serial.tools.list_ports.comports()
-        for port in ports:
-            if 'arduino' in port.description.lower() or 'CH340' in port.description.lower():
-                return port.device
-        return "COM7"
+        self.serial_conn = connection
+        self.current_values = default_values()
+        # 'bulk' blocks on the port and drains every waiting byte per wakeup,
+        # 'poll' is the original in_waiting/readline/sleep loop
+        self.read_mode = 'bulk'
+        # 'ascii' for $int,int,int,float,char lines, 'binary' for binary_frames
+        # (binary always uses the bulk reader)
+        self.frame_format = 'ascii'
+        self.frame_decoder = BinaryFrameDecoder()
+        # Optional callable taking each parsed sample and its arrival time
+        # (e.g. DisplayUpdater.submit). When set it replaces the per-packet
+        # data_processed signal.
+        self.sample_sink = None
+        # Shared fixed-memory record of every sample for charts and checks
+        self.history = TelemetryHistory()
+        # Optional flight_recorder.FlightRecorder receiving every raw frame
+        self.recorder = None
+        # Optional latency.LatencyTracker for the parse and emit stages
+        self.latency = None
+        self.read_timeout = 0.2  # Upper bound on how long stop() waits for a blocked read
+        self.max_frame_size = 256  # Drop the buffer if no newline shows up within this
+        self._rx_buffer = bytearray()
+        # Outgoing commands are written by a separate thread so a slow or
+        # stalled link never blocks the caller (the GUI thread)
+        self.commands = CommandQueue()
+        self.write_timeout = 1.0  # A stalled write gives up after this (seconds)
+        self.command_latency = RollingLatency(256)  # Enqueue -> written, ms
+        self.commands_sent = 0
+        self.commands_failed = 0
+        # Optional command_queue.CommandTracker: commands then go out as
+        # COMMAND#seq and are re-sent until the firmware acknowledges them
+        self.acks = None
+        # Finds the port (when none is given) and paces reconnects after a
+        # USB drop; an injected connection is never reopened
+        self.supervisor = LinkSupervisor()
 
     def parse_data(self, data_string):
-        """Parse $int,int,int,float,char format"""
+        """Parse a text frame (layout in telemetry_schema)"""
         try:
-            if not data_string.startswith('$'):
-                return False
-                
-            parts = data_string[1:].strip().split(',')
-            if len(parts) != 5:
+            values = parse_frame(data_string)
+            if values is None:
                 return False
-                
-            self.current_values = [
-                int(parts[0]),
-                int(parts[1]),
-                int(parts[2]),
-                float(parts[3]),
-                parts[4][0] if parts[4] else ''
-            ]
+            self.current_values = values
             return True
         except (ValueError, IndexError) as e:
             self.status_update.emit(f"Parse error: {str(e)}")
             return False
 
+    def split_frames(self, buffer):
+        """
+        Pop every complete line out of buffer, leaving any partial frame behind
+        Args:
+            buffer (bytearray): Receive buffer, consumed in place
+        Returns:
+            list: Decoded frames, each starting at its '$' marker
+        """
+        return split_frames(buffer, self.max_frame_size)
+
+    def _link_proven(self):
+        """First valid frame since the port opened"""
+        outage_ms = self.supervisor.connected()
+        if outage_ms is not None:
+            self.status_update.emit(f"Serial reconnected in {outage_ms:.0f} ms")
+
+    def _publish(self, values, raw=b'', arrival=None):
+        """
+        Hand a parsed sample to the sink, or emit it if there is none
+        Args:
+            values (list): Parsed sample
+            raw (bytes or str): Frame as received, for the recorder
+            arrival (float): perf_counter() when the frame's bytes were read
+        """
+        if not self.supervisor.up:
+            self._link_proven()
+        latency = self.latency if arrival is not None else None
+        if latency is not None:
+            latency.record('parse', arrival)
+        try:
+            # Out-of-range samples are refused here, never raised on the reader
+            self.history.append(values)
+            if self.recorder is not None:
+                self.recorder.record(raw, values, time.time())
+        except (ValueError, TypeError, OverflowError) as e:
+            self.status_update.emit(f"History error: {str(e)}")
+        if self.acks is not None:
+            self._acknowledged(self.acks.observe_status(values[STATUS]))
+        if self.sample_sink is not None:
+            self.sample_sink(values, arrival)
+        else:
+            self.data_processed.emit(values)
+        if latency is not None:
+            latency.record('emit', arrival)
+
+    def _read_bulk(self):
+        """Event-driven reading: one blocking read per wakeup, all frames parsed"""
+        conn = self.serial_conn
+        buffer = self._rx_buffer
+        buffer.clear()
+        while self._running:
+            # Blocks until the first byte arrives, then takes everything
+            # else already waiting in the driver in the same call
+            chunk = conn.read(max(1, conn.in_waiting))
+            if not chunk:
+                continue
+            arrival = time.perf_counter()
+            if self.frame_format == 'binary':
+                for raw, values in self.frame_decoder.feed(chunk):
+                    self.current_values = values
+                    self._publish(values, raw, arrival)
+                continue
+            buffer += chunk
+            for frame in self.split_frames(buffer):
+                if self.acks is not None and self._match_ack(frame):
+                    continue
+                if self.parse_data(frame):
+                    self._publish(self.current_values, frame, arrival)
+
+    def _read_poll(self):
+        """Original polling loop, one line per 10 ms tick"""
+        while self._running:
+            if self.serial_conn.in_waiting:
+                data = self.serial_conn.readline().decode('utf-8').strip()
+                arrival = time.perf_counter()
+                if self.acks is not None and self._match_ack(data):
+                    continue
+                if self.parse_data(data):
+                    self._publish(self.current_values, data, arrival)
+            time.sleep(0.01)
+
+    def _connect(self, timeout):
+        """
+        Open the link: the given port, or the one the supervisor finds
+        Returns:
+            str or None: Device connected to, None if nothing to connect to yet
+        """
+        device = self.port if self.port is not None else self.supervisor.locator.find()
+        if device is None:
+            return None
+        if self.supervisor.attempts == 0:  # Retries stay quiet
+            self.status_update.emit(f"Connecting to {device}...")
+        # serial_for_url also accepts plain device names (COM7, /dev/ttyUSB0)
+        self.serial_conn = serial.serial_for_url(device, self.baudrate, timeout=timeout,
+                                                 write_timeout=self.write_timeout)
+        return device
+
     def run(self):
-        """Threaded serial reading"""
-        self.port = self.find_arduino_port()
-        self.status_update.emit(f"Connecting to {self.port}...")
+        """Threaded serial reading, reconnecting whenever the link drops"""
+        bulk = self.read_mode == 'bulk' or self.frame_format == 'binary'
+        timeout = self.read_timeout if bulk else 1
+        injected = self.serial_conn is not None
+        if injected:
+            self.serial_conn.timeout = timeout
+            self.serial_conn.write_timeout = self.write_timeout
+        supervisor = self.supervisor
+        writer = threading.Thread(target=self._write_commands, daemon=True)
+        writer.start()
         
         try:
-            self.serial_conn = serial.Serial(self.port, self.baudrate, timeout=1)
-            self.status_update.emit("Serial connected. Waiting for data...")
-            
             while self._running:
-                if self.serial_conn.in_waiting:
-                    data = self.serial_conn.readline().decode('utf-8').strip()
-                    if self.parse_data(data):
-                        self.data_processed.emit(self.current_values)
-                time.sleep(0.01)
+                if self.serial_conn is None:
+                    try:
+                        device = self._connect(timeout)
+                    except serial.SerialException as e:
+                        device = None
+                        if supervisor.attempts == 0:
+                            self.status_update.emit(f"Serial error: {str(e)} (retrying)")
+                    if device is None:
+                        supervisor.failed()
+                        supervisor.wait(lambda: self._running)
+                        continue
+                    if self.port is None:
+                        supervisor.locator.remember(device)
+                # Counts as connected once a frame arrives (_publish) or it stays up
+                supervisor.opened()
+                if not supervisor.ever_connected and supervisor.attempts == 0:
+                    self.status_update.emit("Serial connected. Waiting for data...")
                 
-        except serial.SerialException as e:
-            self.status_update.emit(f"Serial error: {str(e)}")
+                try:
+                    if bulk:
+                        self._read_bulk()
+                    else:
+                        self._read_poll()
+                except (serial.SerialException, OSError) as e:
+                    if supervisor.up or supervisor.attempts == 0:  # Retries stay quiet
+                        self.status_update.emit(f"Serial link lost: {str(e)}")
+                    supervisor.lost()
+                    if injected:
+                        break  # Nothing to reopen
+                    try:
+                        self.serial_conn.close()
+                    except (serial.SerialException, OSError):
+                        pass
+                    self.serial_conn = None
+                    if supervisor.attempts:
+                        # Opened but failed straight away: back off like a failed open
+                        supervisor.wait(lambda: self._running)
         finally:
+            self.commands.close()
+            writer.join(self.write_timeout + 0.5)  # Let a final CMD:LAND out
             if self.serial_conn and self.serial_conn.is_open:
                 self.serial_conn.close()
             self.status_update.emit("Serial processor stopped")
-    
-    def send_command(self, command):
-        """Send a command to the connected serial device"""
-        if self.serial_conn and self.serial_conn.is_open:
+
+    def _match_ack(self, frame):
+        """Handle a $ACK,seq frame; False if the frame is something else"""
+        seq = parse_ack(frame)
+        if seq is None:
+            return False
+        self._acknowledged(self.acks.ack(seq))
+        return True
+
+    def _acknowledged(self, matched):
+        for pending, rtt_ms in matched:
+            self.command_acked.emit(pending.command, rtt_ms)
+
+    def _resend_expired(self):
+        """Re-queue overdue commands, give up on those out of retries"""
+        retry, failed = self.acks.expired()
+        for pending in retry:
+            self.commands.put(pending.command, pending.seq)
+        for pending in failed:
+            self.command_failed.emit(pending.command)
+            self.status_update.emit(f"No acknowledgement for {pending.command} "
+                                    f"after {pending.attempts} attempts")
+
+    def _write_commands(self):
+        """Writer thread: drain the command queue onto the port"""
+        while True:
+            tracking = self.acks is not None
+            # With acknowledgements on, wake regularly to check for timeouts
+            entry = self.commands.get(self.acks.timeout / 4 if tracking else None)
+            if tracking:
+                self._resend_expired()
+            if entry is None:
+                if self.commands.closed:
+                    return  # Closed and drained
+                continue
+            conn = self.serial_conn  # The reader drops it while reconnecting
+            if conn is None or not conn.is_open:
+                self._not_sent(entry, "Serial not connected")
+                continue
+            data = entry.command
+            if tracking:
+                retry = entry.seq is not None
+                if not retry:
+                    entry.seq = self.acks.next_seq()
+                if not self.acks.sending(entry.command, entry.seq, retry):
+                    continue  # Acknowledged while the re-send was queued
+                data = format_command(entry.command, entry.seq)
             try:
-                self.serial_conn.write(command.encode('utf-8'))
-                self.status_update.emit(f"Command sent: {command}")
-                return True
+                conn.write(data.encode('utf-8'))
+            except serial.SerialTimeoutException:
+                if tracking:
+                    self.acks.discard(entry.seq)
+                self._not_sent(entry, "Command timed out")
+                continue
             except Exception as e:
-                self.status_update.emit(f"Failed to send command: {str(e)}")
-                return False
-        else:
-            self.status_update.emit("Cannot send command: Serial not connected")
+                if tracking:
+                    self.acks.discard(entry.seq)
+                self._not_sent(entry, f"Failed to send command ({str(e)})")
+                continue
+            latency_ms = (time.perf_counter() - entry.enqueued) * 1000.0
+            self.command_latency.add(latency_ms)
+            self.commands_sent += 1
+            self.status_update.emit(f"Command sent: {entry.command} ({latency_ms:.1f} ms)")
+    
+    def _port_open(self):
+        conn = self.serial_conn
+        return conn is not None and conn.is_open
+
+    def _not_sent(self, entry, reason):
+        """
+        A command could not be written. A LAND is held and sent once the link
+        is back; anything else is reported as failed (a stale TAKEOFF or
+        direction must not go out minutes later on a reconnect).
+        """
+        if entry.priority == SAFETY and self._running:
+            entry.seq = None  # Tracked afresh when it finally goes out
+            self.commands.requeue(entry)
+            self.status_update.emit(f"{reason}: holding {entry.command} until the link is back")
+            time.sleep(0.05)  # A port that is open but failing writes isn't retried flat out
+            while self._running and not self._port_open():
+                time.sleep(0.05)
+            return
+        self.commands_failed += 1
+        self.command_failed.emit(entry.command)
+        self.status_update.emit(f"{reason}: {entry.command}")
+
+    def send_command(self, command):
+        """
+        Queue a command for the writer thread (never blocks on the port)
+        Returns:
+            bool: False if the port is not connected (a LAND is queued anyway
+            while the link is being re-established)
+        """
+        if self._port_open():
+            self.commands.put(command)
+            return True
+        if self._running and priority_of(command) == SAFETY:
+            self.commands.put(command)
+            self.status_update.emit(f"Serial not connected: {command} queued until the link is back")
             return False
+        self.status_update.emit("Cannot send command: Serial not connected")
+        return False
+
+    def command_stats(self):
+        """Counters and enqueue-to-wire latency percentiles (ms) of sent commands"""
+        stats = {'sent': self.commands_sent, 'failed': self.commands_failed,
+                 'coalesced': self.commands.coalesced,
+                 'preempted': self.commands.preempted, 'queued': len(self.commands)}
+        percentiles = self.command_latency.percentiles()
+        if percentiles is not None:
+            stats.update(zip(('p50', 'p95', 'p99'), percentiles))
+        return stats
 
     def stop(self):
         self._running = False
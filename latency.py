@@ -0,0 +1,128 @@
+"""
+Per-packet latency tracking.
+
+Every stage is measured from the moment the packet's bytes came off the
+port (time.perf_counter()), so the stage percentiles show where a laggy
+gauge loses its time:
+
+    parse    bytes read -> parse_data done
+    emit     bytes read -> handed to the display pipeline
+    update   bytes read -> DataDisplay.update_values done
+    paint    bytes read -> first gauge repaint showing the sample
+"""
+import json
+import time
+from array import array
+import numpy as np
+
+STAGES = ('parse', 'emit', 'update', 'paint')
+PERCENTILES = (50, 95, 99)
+
+
+class RollingLatency:
+    """The last `window` latencies of one stage, in milliseconds"""
+
+    def __init__(self, window=2048):
+        self.window = window
+        self._samples = array('d', bytes(8 * window))
+        self._next = 0
+        self.count = 0  # Total samples ever recorded
+
+    def add(self, latency_ms):
+        self._samples[self._next] = latency_ms
+        self._next = (self._next + 1) % self.window
+        self.count += 1
+
+    def values(self):
+        filled = min(self.count, self.window)
+        return np.frombuffer(self._samples, dtype=np.float64, count=filled).copy()
+
+    def percentiles(self):
+        """(p50, p95, p99) over the window, or None before the first sample"""
+        samples = self.values()
+        if samples.size == 0:
+            return None
+        return tuple(float(v) for v in np.percentile(samples, PERCENTILES))
+
+
+class LatencyTracker:
+    """Rolling latency windows for every pipeline stage"""
+
+    def __init__(self, window=2048):
+        self.stages = {name: RollingLatency(window) for name in STAGES}
+
+    def record(self, stage, arrival, now=None):
+        """
+        Record that a packet which arrived at `arrival` reached `stage`
+        Args:
+            stage (str): One of STAGES
+            arrival (float): time.perf_counter() when its bytes were read
+            now (float): Completion time, defaults to time.perf_counter()
+        """
+        if now is None:
+            now = time.perf_counter()
+        self.stages[stage].add((now - arrival) * 1000.0)
+
+    def summary(self):
+        """{stage: {'p50', 'p95', 'p99', 'count'}} for stages with data"""
+        result = {}
+        for name, stage in self.stages.items():
+            values = stage.percentiles()
+            if values is not None:
+                result[name] = dict(zip(('p50', 'p95', 'p99'), values))
+                result[name]['count'] = stage.count
+        return result
+
+    def summary_text(self):
+        """One-line p50/p95/p99 summary for the status label"""
+        parts = [f"{name} {s['p50']:.1f}/{s['p95']:.1f}/{s['p99']:.1f}"
+                 for name, s in self.summary().items()]
+        if not parts:
+            return "latency: no data"
+        return "latency ms p50/p95/p99: " + ", ".join(parts)
+
+    def export(self, path):
+        """Write the summary and the raw windows to a JSON file"""
+        data = {
+            'exported': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'unit': 'ms',
+            'summary': self.summary(),
+            'samples': {name: stage.values().tolist()
+                        for name, stage in self.stages.items()},
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+
+class StartupTimeline:
+    """Named checkpoints from process start-up, for --profile-startup"""
+
+    def __init__(self, started=None):
+        """
+        Args:
+            started (float): time.perf_counter() at the start, defaults to now
+        """
+        self.started = time.perf_counter() if started is None else started
+        self.marks = []  # (name, perf_counter)
+
+    def mark(self, name):
+        """Record a checkpoint; only the first one with a given name counts"""
+        if not any(existing == name for existing, _ in self.marks):
+            self.marks.append((name, time.perf_counter()))
+
+    def elapsed(self, name):
+        """Milliseconds from start to the checkpoint, None if not reached"""
+        for existing, when in self.marks:
+            if existing == name:
+                return (when - self.started) * 1000.0
+        return None
+
+    def report(self):
+        """Checkpoint table: time since start and since the previous mark"""
+        lines = [f"{'checkpoint':<24}{'at ms':>10}{'step ms':>10}"]
+        previous = self.started
+        for name, when in self.marks:
+            lines.append(f"{name:<24}{(when - self.started) * 1000:>10.1f}"
+                         f"{(when - previous) * 1000:>10.1f}")
+            previous = when
+        return "\n".join(lines)
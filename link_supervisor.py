@@ -0,0 +1,234 @@
+"""
+Port discovery and automatic reconnection for the telemetry link.
+
+PortLocator remembers the last good adapter by USB VID/PID/serial number
+(in .port_cache.json) and finds it again, even under a new device name,
+without enumerating every port on each retry: the full
+serial.tools.list_ports scan only runs when a cheap hotplug fingerprint
+(the /dev serial device names, or the Windows SERIALCOMM registry key)
+has changed. LinkSupervisor schedules reconnect attempts with exponential
+backoff and times how long each outage lasted. A port that opens counts as
+connected only once a valid frame arrives or it has stayed up for
+min_uptime; one that fails sooner is just another failed attempt.
+"""
+import glob
+import json
+import os
+import sys
+import time
+import serial.tools.list_ports
+from latency import RollingLatency
+
+PORT_CACHE = '.port_cache.json'
+# USB vendor IDs of the flight controller adapters we ship
+KNOWN_VIDS = {0x2341: 'Arduino', 0x2A03: 'Arduino', 0x1A86: 'CH340'}
+DEFAULT_WINDOWS_PORT = 'COM7'  # Tried on Windows when no adapter is recognised
+# Device names USB serial adapters show up under
+DEVICE_PATTERNS = ('/dev/ttyUSB*', '/dev/ttyACM*', '/dev/cu.usb*', '/dev/tty.usb*')
+
+
+def is_flight_controller(port):
+    """True for Arduino and CH340 adapters (by USB VID or description)"""
+    if port.vid in KNOWN_VIDS:
+        return True
+    description = (port.description or '').lower()
+    return 'arduino' in description or 'ch340' in description
+
+
+def port_identity(port):
+    """What identifies an adapter across replugs: VID, PID and serial number"""
+    return {'vid': port.vid, 'pid': port.pid, 'serial_number': port.serial_number}
+
+
+def hotplug_token():
+    """Cheap fingerprint of the attached serial devices; changes on plug/unplug"""
+    if sys.platform.startswith('win'):
+        try:
+            import winreg
+            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE,
+                                r'HARDWARE\DEVICEMAP\SERIALCOMM') as key:
+                names = []
+                index = 0
+                while True:
+                    try:
+                        names.append(winreg.EnumValue(key, index)[1])
+                    except OSError:
+                        break
+                    index += 1
+                return tuple(sorted(names))
+        except OSError:
+            return None  # No serial ports at all
+    return tuple(sorted(path for pattern in DEVICE_PATTERNS for path in glob.glob(pattern)))
+
+
+class PortLocator:
+    """Finds the flight controller's port, preferring the last good adapter"""
+
+    def __init__(self, cache_path=PORT_CACHE):
+        self.cache_path = cache_path
+        self.cached = self._load()  # {'device', 'vid', 'pid', 'serial_number'}
+        self.scans = 0  # Full port enumerations done
+        self._token = None  # Fingerprint at the last full scan
+        self._seen = None   # Fingerprint at the last changed() call
+        self._ports = []
+
+    def _load(self):
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _scan(self):
+        """Enumerate ports again, but only if the hotplug fingerprint changed"""
+        token = hotplug_token()
+        if token != self._token or not self._ports:
+            self._ports = serial.tools.list_ports.comports()
+            self._token = token
+            self.scans += 1
+        return self._ports
+
+    def _present(self, device):
+        if sys.platform.startswith('win'):
+            token = hotplug_token()
+            return token is not None and device in token
+        return os.path.exists(device)
+
+    def find(self):
+        """
+        Best port to try now
+        Returns:
+            str or None: Device name, None if nothing suitable is attached
+        """
+        cached = self.cached
+        if cached and self._present(cached['device']):
+            return cached['device']  # Fast path, no enumeration
+        ports = self._scan()
+        if cached and cached.get('vid') is not None:
+            for port in ports:
+                if port_identity(port) == {key: cached.get(key) for key in
+                                           ('vid', 'pid', 'serial_number')}:
+                    return port.device  # Same adapter under a new name
+        for port in ports:
+            if is_flight_controller(port):
+                return port.device
+        return DEFAULT_WINDOWS_PORT if sys.platform.startswith('win') else None
+
+    def changed(self):
+        """True if devices were plugged or unplugged since the previous call"""
+        token = hotplug_token()
+        changed = self._seen is not None and token != self._seen
+        self._seen = token
+        return changed
+
+    def remember(self, device):
+        """Cache the adapter behind a port that just connected"""
+        port = next((p for p in self._scan() if p.device == device), None)
+        entry = {'device': device}
+        if port is not None:
+            entry.update(port_identity(port))
+        elif self.cached and self.cached.get('device') == device:
+            return  # Not a USB adapter we can describe (pty, URL); keep what we have
+        if entry == self.cached:
+            return
+        self.cached = entry
+        try:
+            temp_path = self.cache_path + ".part"
+            with open(temp_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError:
+            pass  # Read-only directory: discovery just won't be cached
+
+
+class LinkSupervisor:
+    """Reconnect schedule and outage metrics for one link"""
+
+    def __init__(self, base_delay=0.05, max_delay=2.0, locator=None, min_uptime=1.0):
+        """
+        Args:
+            base_delay (float): First retry delay in seconds, doubled per failure
+            max_delay (float): Longest wait between attempts
+            min_uptime (float): Seconds an open port must survive without a
+                valid frame to count as connected
+        """
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.min_uptime = min_uptime
+        self.locator = locator if locator is not None else PortLocator()
+        self.attempts = 0         # Failed attempts in the current outage
+        self.down_since = None    # perf_counter() when the link dropped
+        self.opened_at = None     # perf_counter() when the current port opened
+        self.up = False           # The current port has proven itself
+        self.ever_connected = False
+        self.reconnects = 0
+        self.reconnect_ms = RollingLatency(64)
+
+    def lost(self):
+        """The link just dropped (or the first connection failed)"""
+        now = time.perf_counter()
+        if self.opened_at is not None:
+            if not self.up:
+                if now - self.opened_at >= self.min_uptime:
+                    self.connected(self.opened_at)  # No frames, but it did stay up
+                else:
+                    self.attempts += 1  # Opened, then failed at once: back off
+            self.opened_at = None
+            self.up = False
+        if self.down_since is None:
+            self.down_since = now
+
+    def failed(self):
+        """A reconnect attempt failed"""
+        self.lost()
+        self.attempts += 1
+
+    def opened(self):
+        """The port opened; the backoff is only reset once connected() confirms it"""
+        self.opened_at = time.perf_counter()
+        self.up = False
+
+    def connected(self, at=None):
+        """
+        The link proved itself (a valid frame arrived)
+        Args:
+            at (float): perf_counter() the outage ended, default now
+        Returns:
+            float or None: Outage length in ms if this was a reconnect
+        """
+        outage = None
+        if self.down_since is not None and self.ever_connected:
+            outage = ((time.perf_counter() if at is None else at) - self.down_since) * 1000.0
+            self.reconnect_ms.add(outage)
+            self.reconnects += 1
+        self.down_since = None
+        self.attempts = 0
+        self.up = True
+        self.ever_connected = True
+        return outage
+
+    def next_delay(self):
+        """Seconds to wait before the next attempt"""
+        if self.attempts == 0:
+            return 0.0
+        return min(self.max_delay, self.base_delay * 2 ** (self.attempts - 1))
+
+    def wait(self, running):
+        """
+        Sleep until the next attempt, waking early on a hotplug event
+        Args:
+            running (callable): Returns False to abandon the wait
+        """
+        deadline = time.perf_counter() + self.next_delay()
+        while running() and time.perf_counter() < deadline:
+            if self.locator.changed():
+                return  # Something was plugged in: try right away
+            time.sleep(min(0.02, max(0.0, deadline - time.perf_counter())))
+
+    def stats(self):
+        """Reconnect count and outage percentiles (ms)"""
+        stats = {'reconnects': self.reconnects}
+        percentiles = self.reconnect_ms.percentiles()
+        if percentiles is not None:
+            stats.update(zip(('p50', 'p95', 'p99'), percentiles))
+        return stats
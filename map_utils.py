@@ -1,36 +1,400 @@
 import os
 import math
 import time
+import argparse
+import threading
 import requests
-from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from tile_store import (MBTilesStore, TileManifest, DEFAULT_STORE, content_hash,
+                        lat_lon_to_tile, tile_position)
+from track import EARTH_RADIUS
+
+TILE_URL = "https://tile.openstreetmap.org/{z}/{x}/{y}.png"
+
+# User-Agent header to identify our requests
+HEADERS = {
+    'User-Agent': 'DroneControlApp/1.0 (https://example.com)'
+}
+
+
+class TokenBucket:
+    """Thread-safe rate limiter: `rate` tokens per second, bursts up to `burst`"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _file_matches(path, size, tile_hash):
+    """Whether a file holds exactly the image with this size and hash"""
+    if os.path.getsize(path) != size:
+        return False
+    with open(path, 'rb') as f:
+        return content_hash(f.read()) == tile_hash
+
+
+class TileDownloader:
+    """Bounded worker pool over one keep-alive session, rate limited per server policy"""
+
+    def __init__(self, base_url=TILE_URL, tiles_dir="tiles", workers=2, rate=2.0,
+                 retries=3, backoff=1.0, timeout=10, store=None, refresh=False):
+        """
+        Args:
+            base_url (str): Tile URL template with {z}, {x} and {y}
+            tiles_dir (str): Root of the tiles/{z}/{x}/{y}.png tree
+            store (MBTilesStore): Write into this store instead of tiles_dir
+            refresh (bool): Revalidate tiles already stored with conditional
+                requests and rewrite only those that changed
+            workers (int): Concurrent requests (OSM policy allows 2)
+            rate (float): Maximum requests per second across all workers
+            retries (int): Attempts per tile for timeouts, 429 and 5xx
+            backoff (float): First retry delay in seconds, doubled each attempt
+        """
+        self.base_url = base_url
+        self.tiles_dir = tiles_dir
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.store = store
+        self.refresh = refresh
+        # ETag / Last-Modified / content hash per tile
+        self.manifest = store if store is not None else TileManifest(tiles_dir)
+        self.bucket = TokenBucket(rate, burst=workers)
+
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.counts = {'downloaded': 0, 'updated': 0, 'unchanged': 0,
+                       'exists': 0, 'missing': 0, 'failed': 0}
+        self.bytes = 0
+        self.deduplicated = 0  # Tiles saved as a reference to an identical image
+        self._lock = threading.Lock()
+        # One file per distinct image for hard-linking duplicates in tiles_dir,
+        # and the reverse, so a file being rewritten stops standing for its image
+        self._blobs = {}
+        if store is None:
+            self._blobs = {tile_hash: self.tile_file(*tile)
+                           for tile_hash, tile in self.manifest.hashes().items()}
+        self._blob_files = {path: tile_hash for tile_hash, path in self._blobs.items()}
+
+    def tile_file(self, zoom, x, y):
+        return os.path.join(self.tiles_dir, str(zoom), str(x), f"{y}.png")
+
+    def _exists(self, zoom, x, y):
+        if self.store is not None:
+            return self.store.has_tile(zoom, x, y)
+        return os.path.exists(self.tile_file(zoom, x, y))
+
+    def _stored_hash(self, zoom, x, y):
+        """Content hash of the tile we already have, from the manifest or the data"""
+        known = self.manifest.get_manifest(zoom, x, y)
+        if known and known[2]:
+            return known
+        if self.store is not None:
+            data = self.store.get_tile(zoom, x, y)
+        else:
+            with open(self.tile_file(zoom, x, y), 'rb') as f:
+                data = f.read()
+        return (None, None, content_hash(data) if data is not None else None)
+
+    def _save(self, zoom, x, y, content, tile_hash):
+        if self.store is not None:
+            if self.store.has_image(tile_hash):
+                with self._lock:
+                    self.deduplicated += 1
+            self.store.put_tile(zoom, x, y, content)
+            return
+        tile_file = self.tile_file(zoom, x, y)
+        os.makedirs(os.path.dirname(tile_file), exist_ok=True)
+        temp_file = tile_file + ".part"
+        if os.path.exists(temp_file):
+            os.remove(temp_file)  # Left by an interrupted run, may be a link to another tile
+        with self._lock:
+            previous = self._blob_files.pop(tile_file, None)
+            if previous is not None and previous != tile_hash:
+                self._blobs.pop(previous, None)  # tile_file is about to hold other bytes
+            original = self._blobs.setdefault(tile_hash, tile_file)
+            if original == tile_file:
+                self._blob_files[tile_file] = tile_hash
+        if original != tile_file:
+            try:
+                os.link(original, temp_file)  # Identical image, share the file
+            except OSError:
+                pass  # Gone, or no hard links here (e.g. FAT): write a copy
+            else:
+                # original may have been rewritten since it was recorded; the
+                # linked file can't change any more, so check that one
+                if _file_matches(temp_file, len(content), tile_hash):
+                    os.replace(temp_file, tile_file)
+                    with self._lock:
+                        self.deduplicated += 1
+                    return
+                os.remove(temp_file)
+            with self._lock:
+                if self._blobs.get(tile_hash) == original:
+                    if self._blob_files.get(original) == tile_hash:
+                        del self._blob_files[original]
+                    self._blobs[tile_hash] = tile_file
+                    self._blob_files[tile_file] = tile_hash
+        with open(temp_file, 'wb') as f:
+            f.write(content)
+        os.replace(temp_file, tile_file)  # Never leave a half-written tile behind
+
+    def _remember(self, zoom, x, y, response, tile_hash, known=None):
+        etag = response.headers.get('ETag') or (known[0] if known else None)
+        last_modified = response.headers.get('Last-Modified') or (known[1] if known else None)
+        self.manifest.update_manifest(zoom, x, y, etag, last_modified, tile_hash, time.time())
+
+    def fetch(self, zoom, x, y):
+        """
+        Download one tile unless it is already stored; in refresh mode
+        revalidate stored tiles with a conditional request instead
+        Returns:
+            str: 'downloaded', 'updated', 'unchanged', 'exists',
+                 'missing' (404) or 'failed'
+        """
+        exists = self._exists(zoom, x, y)
+        if exists and not self.refresh:
+            return 'exists'
+
+        known = self._stored_hash(zoom, x, y) if exists else None
+        headers = {}
+        if known and known[0]:
+            headers['If-None-Match'] = known[0]
+        if known and known[1]:
+            headers['If-Modified-Since'] = known[1]
+
+        url = self.base_url.format(z=zoom, x=x, y=y)
+        for attempt in range(self.retries):
+            delay = self.backoff * 2 ** attempt
+            self.bucket.acquire()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                print(f"Error downloading {zoom}/{x}/{y}: {str(e)}")
+            else:
+                if response.status_code == 304 and known:
+                    self._remember(zoom, x, y, response, known[2], known)
+                    return 'unchanged'
+                if response.status_code == 200:
+                    content = response.content
+                    tile_hash = content_hash(content)
+                    with self._lock:
+                        self.bytes += len(content)
+                    if known and known[2] == tile_hash:
+                        # Server ignored the conditional headers, nothing to rewrite
+                        self._remember(zoom, x, y, response, tile_hash, known)
+                        return 'unchanged'
+                    self._save(zoom, x, y, content, tile_hash)
+                    self._remember(zoom, x, y, response, tile_hash)
+                    return 'updated' if exists else 'downloaded'
+                if response.status_code == 404:
+                    print(f"Tile not found (404): {zoom}/{x}/{y}")
+                    return 'missing'  # Don't retry 404 errors
+                print(f"Failed to download {zoom}/{x}/{y} (HTTP {response.status_code})")
+                if response.status_code != 429 and response.status_code < 500:
+                    return 'failed'  # Other client errors won't fix themselves
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+
+            if attempt + 1 < self.retries:
+                time.sleep(delay)
+        return 'failed'
+
+    def download(self, tiles):
+        """
+        Download a list of (zoom, x, y) tiles, printing progress and ETA
+        Returns:
+            dict: Count of tiles per outcome
+        """
+        total = len(tiles)
+        started = time.monotonic()
+        last_report = 0
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(self.fetch, *tile) for tile in tiles]
+            for future in as_completed(futures):
+                outcome = future.result()
+                self.counts[outcome] += 1
+                done += 1
+
+                now = time.monotonic()
+                if now - last_report >= 1 or done == total:
+                    last_report = now
+                    elapsed = now - started
+                    rate = done / elapsed if elapsed > 0 else 0
+                    eta = (total - done) / rate if rate > 0 else 0
+                    print(f"[{done}/{total}] {rate:.1f} tiles/s, "
+                          f"{self.bytes / 1024:.0f} KiB, ETA {eta:.0f}s")
+
+        if self.store is not None:
+            self.store.commit()
+            if self.refresh:
+                self.store.prune_images()  # Drop images replaced by newer tiles
+        else:
+            self.manifest.save()
+        print("Summary: " + ", ".join(f"{count} {outcome}"
+                                      for outcome, count in self.counts.items()) +
+              f" ({self.deduplicated} stored as duplicates)")
+        return dict(self.counts)
+
+
+AVERAGE_TILE_BYTES = 20 * 1024  # Typical OSM raster tile, for size estimates
+
+
+def tiles_for_bbox(south, west, north, east, zoom):
+    """Every tile overlapping a lat/lon bounding box"""
+    n = 2 ** zoom
+    x0, y0 = tile_position(north, west, zoom)
+    x1, y1 = tile_position(south, east, zoom)
+    return {(x, y)
+            for x in range(max(0, int(x0)), min(n - 1, int(x1)) + 1)
+            for y in range(max(0, int(y0)), min(n - 1, int(y1)) + 1)}
+
+
+def _point_in_polygon(x, y, points):
+    inside = False
+    for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1]):
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+
+def tiles_for_polygon(polygon, zoom):
+    """
+    Exactly the tiles a polygon touches at one zoom level
+    Args:
+        polygon (list): [(lat, lon), ...] vertices, closed implicitly
+    """
+    n = 2 ** zoom
+    points = [tile_position(lat, lon, zoom) for lat, lon in polygon]
+    edges = list(zip(points, points[1:] + points[:1]))
+    ys = [y for _, y in points]
+    tiles = set()
+    for row in range(max(0, int(min(ys))), min(n - 1, int(max(ys))) + 1):
+        # Tiles in this row crossed by an edge ...
+        boundary = set()
+        for (x1, y1), (x2, y2) in edges:
+            if max(y1, y2) < row or min(y1, y2) > row + 1:
+                continue
+            if y1 == y2:
+                xa, xb = x1, x2
+            else:
+                ta, tb = sorted(((row - y1) / (y2 - y1), (row + 1 - y1) / (y2 - y1)))
+                ta, tb = max(0.0, ta), min(1.0, tb)
+                xa, xb = x1 + (x2 - x1) * ta, x1 + (x2 - x1) * tb
+            boundary.update(range(int(min(xa, xb)), int(max(xa, xb)) + 1))
+        if not boundary:
+            continue
+        # ... plus those lying wholly inside it
+        for col in range(max(0, min(boundary)), min(n - 1, max(boundary)) + 1):
+            if col in boundary or _point_in_polygon(col + 0.5, row + 0.5, points):
+                tiles.add((col, row))
+    return tiles
+
+
+def circle_polygon(lat, lon, radius_m, segments=72):
+    """Polygon enclosing a ground circle (vertices pushed out so edges stay outside it)"""
+    radius = radius_m / math.cos(math.pi / segments)
+    angular = radius / EARTH_RADIUS
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    points = []
+    for i in range(segments):
+        bearing = 2 * math.pi * i / segments
+        lat2 = math.asin(math.sin(lat1) * math.cos(angular) +
+                         math.cos(lat1) * math.sin(angular) * math.cos(bearing))
+        lon2 = lon1 + math.atan2(math.sin(bearing) * math.sin(angular) * math.cos(lat1),
+                                 math.cos(angular) - math.sin(lat1) * math.sin(lat2))
+        points.append((math.degrees(lat2), math.degrees(lon2)))
+    return points
+
+
+def plan_tiles(zoom_levels, bbox=None, polygon=None, center=None, radius_m=None):
+    """
+    Deduplicated tile set per zoom for an operational area
+    Args:
+        zoom_levels: Iterable of zoom levels
+        bbox (tuple): (south, west, north, east)
+        polygon (list): [(lat, lon), ...]
+        center (tuple): (lat, lon), together with radius_m in metres
+    Returns:
+        dict: {zoom: sorted [(x, y), ...]}
+    """
+    if center is not None and radius_m is not None:
+        polygon = circle_polygon(center[0], center[1], radius_m)
+    plan = {}
+    for zoom in zoom_levels:
+        if polygon is not None:
+            tiles = tiles_for_polygon(polygon, zoom)
+        elif bbox is not None:
+            tiles = tiles_for_bbox(*bbox, zoom)
+        else:
+            raise ValueError("plan_tiles needs a bbox, polygon or center and radius")
+        plan[zoom] = sorted(tiles)
+    return plan
+
+
+def estimate_plan(plan, tile_bytes=AVERAGE_TILE_BYTES, store=None):
+    """
+    Tile counts and approximate download size for a plan
+    Tiles already in `store` are counted separately and not in the size.
+    """
+    per_zoom = {}
+    to_fetch = 0
+    for zoom, tiles in plan.items():
+        stored = sum(1 for x, y in tiles if store.has_tile(zoom, x, y)) if store else 0
+        per_zoom[zoom] = {'tiles': len(tiles), 'stored': stored}
+        to_fetch += len(tiles) - stored
+    return {
+        'zooms': per_zoom,
+        'tiles': sum(len(tiles) for tiles in plan.values()),
+        'to_fetch': to_fetch,
+        'bytes': to_fetch * tile_bytes,
+    }
+
+
+def download_map_tiles(downloader=None, plan=None):
+    """Download map tiles for offline use, by default around a fixed coordinate"""
+    if downloader is None:
+        downloader = TileDownloader()
+    if plan is not None:
+        return downloader.download([(zoom, x, y) for zoom, tiles in plan.items()
+                                    for x, y in tiles])
 
-def download_map_tiles():
-    """Download map tiles for offline use around a fixed coordinate"""
     # Fixed coordinates and zoom levels
     center_lat = 28.402236
     center_lon = 76.988318
     zoom_levels = range(12, 19)  # Zoom levels 12-18
     tile_radius = 2  # How many tiles around center to download
-    
-    # Create tiles directory structure
-    os.makedirs("tiles", exist_ok=True)
-    
-    # User-Agent header to identify our requests
-    headers = {
-        'User-Agent': 'DroneControlApp/1.0 (https://example.com)'
-    }
-    
+
+    tiles = []
     for zoom in zoom_levels:
         # Calculate tile coordinates for center point
         n = 2 ** zoom
-        xtile = int((center_lon + 180.0) / 360.0 * n)
-        ytile = int((1.0 - math.log(math.tan(math.radians(center_lat)) + 
-                   1.0 / math.cos(math.radians(center_lat))) / math.pi) / 2.0 * n)
-        
-        # Create zoom level directory
-        zoom_dir = os.path.join("tiles", str(zoom))
-        os.makedirs(zoom_dir, exist_ok=True)
-        
+        xtile, ytile = lat_lon_to_tile(center_lat, center_lon, zoom)
+
         # Download tiles around center point
         for x in range(xtile - tile_radius, xtile + tile_radius + 1):
             for y in range(ytile - tile_radius, ytile + tile_radius + 1):
@@ -38,39 +402,93 @@ def download_map_tiles():
                 if x < 0 or y < 0 or x >= n or y >= n:
                     print(f"Skipping invalid tile {zoom}/{x}/{y}")
                     continue
-                
-                tile_url = f"https://tile.openstreetmap.org/{zoom}/{x}/{y}.png"
-                tile_path = os.path.join(zoom_dir, f"{x}")
-                os.makedirs(tile_path, exist_ok=True)
-                tile_file = os.path.join(tile_path, f"{y}.png")
-                
-                if not os.path.exists(tile_file):
-                    retries = 3
-                    while retries > 0:
-                        try:
-                            response = requests.get(tile_url, headers=headers, stream=True, timeout=10)
-                            if response.status_code == 200:
-                                with open(tile_file, 'wb') as f:
-                                    for chunk in response.iter_content(1024):
-                                        f.write(chunk)
-                                print(f"Downloaded tile {zoom}/{x}/{y}")
-                                break  # Success, exit retry loop
-                            elif response.status_code == 404:
-                                print(f"Tile not found (404): {zoom}/{x}/{y}")
-                                break  # Don't retry 404 errors
-                            else:
-                                print(f"Failed to download {zoom}/{x}/{y} (HTTP {response.status_code})")
-                        except Exception as e:
-                            print(f"Error downloading {zoom}/{x}/{y}: {str(e)}")
-                        
-                        retries -= 1
-                        if retries > 0:
-                            print(f"Retrying ({retries} attempts remaining)...")
-                            time.sleep(2)  # Wait before retrying
-                    
-                    time.sleep(0.5)  # Be polite to the server between requests
+                tiles.append((zoom, x, y))
+
+    return downloader.download(tiles)
+
+
+def _floats(text, count=None):
+    values = [float(part) for part in text.split(',')]
+    if count is not None and len(values) != count:
+        raise argparse.ArgumentTypeError(f"expected {count} comma-separated numbers")
+    return values
+
+
+def _zoom_range(text):
+    low, _, high = text.partition('-')
+    return range(int(low), int(high or low) + 1)
+
+
+def plan_from_args(args):
+    """Tile plan for the area options given, or None for the legacy fixed square"""
+    if args.bbox:
+        return plan_tiles(args.zooms, bbox=_floats(args.bbox, 4))
+    if args.polygon:
+        polygon = [tuple(_floats(point, 2)) for point in args.polygon.split(';')]
+        return plan_tiles(args.zooms, polygon=polygon)
+    if args.radius:
+        return plan_tiles(args.zooms, center=_floats(args.center, 2), radius_m=args.radius)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download map tiles for offline use")
+    parser.add_argument('--store', default=DEFAULT_STORE,
+                        help=f"tile store to write into (default: {DEFAULT_STORE})")
+    parser.add_argument('--tiles-dir',
+                        help="write loose tiles/{z}/{x}/{y}.png files here instead of a store")
+    parser.add_argument('--pack', metavar='DIR',
+                        help="import an existing tile directory into the store and exit")
+    parser.add_argument('--check', action='store_true',
+                        help="run a full integrity check of the store and exit")
+    area = parser.add_argument_group("operational area (default: fixed square around the map centre)")
+    area.add_argument('--bbox', metavar='S,W,N,E', help="bounding box in degrees")
+    area.add_argument('--polygon', metavar='LAT,LON;LAT,LON;...', help="polygon vertices")
+    area.add_argument('--center', metavar='LAT,LON', default="28.402236,76.988318",
+                      help="circle centre for --radius")
+    area.add_argument('--radius', type=float, metavar='METRES', help="circle radius in metres")
+    area.add_argument('--zooms', type=_zoom_range, default=range(12, 19),
+                      help="zoom levels, e.g. 12-18 (default)")
+    area.add_argument('--estimate', action='store_true',
+                      help="print tile count and size estimate without downloading")
+    parser.add_argument('--refresh', action='store_true',
+                        help="revalidate stored tiles (If-None-Match / If-Modified-Since) "
+                             "and rewrite only changed ones")
+    args = parser.parse_args()
+
+    plan = plan_from_args(args)
+    if args.estimate:
+        if plan is None:
+            parser.error("--estimate needs --bbox, --polygon or --radius")
+        store = MBTilesStore(args.store) if os.path.exists(args.store) else None
+        estimate = estimate_plan(plan, store=store)
+        for zoom, counts in estimate['zooms'].items():
+            print(f"z{zoom}: {counts['tiles']} tiles ({counts['stored']} already stored)")
+        print(f"Total {estimate['tiles']} tiles, {estimate['to_fetch']} to fetch, "
+              f"~{estimate['bytes'] / 1024 / 1024:.1f} MiB")
+        return
+
+    if args.tiles_dir:
+        print("Starting tile download...")
+        download_map_tiles(TileDownloader(tiles_dir=args.tiles_dir, refresh=args.refresh), plan)
+        print("Tile download completed.")
+        return
+
+    store = MBTilesStore(args.store)
+    try:
+        if args.check:
+            pass  # Just the report below
+        elif args.pack:
+            print(f"Packed {store.import_directory(args.pack)} tiles into {args.store}")
+        else:
+            print("Starting tile download...")
+            download_map_tiles(TileDownloader(store=store, refresh=args.refresh), plan)
+            print("Tile download completed.")
+        report = store.check_integrity()
+        print(f"{args.store}: {report['tiles']} tiles, {report['images']} unique images, "
+              f"integrity {'ok' if report['ok'] else 'FAILED'}")
+    finally:
+        store.close()
 
 if __name__ == "__main__":
-    print("Starting tile download...")
-    download_map_tiles()
-    print("Tile download completed.")
\ No newline at end of file
+    main()
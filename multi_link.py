@@ -0,0 +1,321 @@
+"""
+Many telemetry links on one thread.
+
+LinkEngine reads any number of serial ports (vehicles, relay radios) from a
+single selectors loop and tags every sample with its link ID. Samples go to
+a per-link sink (e.g. that vehicle's DisplayUpdater.submit) and to shared
+sinks such as LinkTable. Ports without a selectable file descriptor
+(Windows COM ports, loop://) are polled from the same thread.
+
+Load test against simulated vehicles:
+
+    python multi_link.py --simulate 32 --rate 50 --seconds 10
+"""
+import argparse
+import selectors
+import threading
+import time
+import serial
+from PyQt5.QtCore import Qt, QObject, pyqtSignal, QTimer
+from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem, QHeaderView
+from binary_frames import BinaryFrameDecoder
+from functions import split_frames
+from telemetry_schema import FIELDS, default_values, parse_frame
+
+POLL_INTERVAL = 0.005  # Seconds between polls of non-selectable ports
+
+
+class TelemetryLink:
+    """One port's connection, receive buffer and counters"""
+
+    def __init__(self, link_id, port=None, connection=None, frame_format='ascii',
+                 baudrate=57600, sink=None):
+        """
+        Args:
+            link_id (str): Tag carried by every sample from this link
+            port (str): Device or pyserial URL to open
+            connection: Already open serial object to read instead
+            frame_format (str): 'ascii' or 'binary'
+            sink: Callable taking (values, arrival) for this link's samples
+        """
+        self.link_id = link_id
+        self.port = port
+        self.connection = connection
+        self.frame_format = frame_format
+        self.baudrate = baudrate
+        self.sink = sink
+        self.max_frame_size = 256
+        self.buffer = bytearray()
+        self.decoder = BinaryFrameDecoder()
+        self.current_values = default_values()
+        self.connected = False
+        self.bytes = 0
+        self.samples = 0
+        self.errors = 0
+        self.last_sample = None  # time.time() of the newest sample
+
+    def open(self):
+        if self.connection is None:
+            # Non-blocking: the engine only reads what the driver already has
+            self.connection = serial.serial_for_url(self.port, self.baudrate, timeout=0)
+        else:
+            self.connection.timeout = 0
+        self.connected = True
+
+    def fileno(self):
+        """Selectable descriptor, or None if the port has to be polled"""
+        try:
+            return self.connection.fileno()
+        except (AttributeError, OSError, ValueError):
+            return None
+
+    def feed(self, chunk):
+        """
+        Parse a chunk of received bytes
+        Returns:
+            list: Samples completed by this chunk
+        """
+        self.bytes += len(chunk)
+        if self.frame_format == 'binary':
+            samples = [values for _, values in self.decoder.feed(chunk)]
+        else:
+            self.buffer += chunk
+            samples = []
+            for frame in split_frames(self.buffer, self.max_frame_size):
+                try:
+                    values = parse_frame(frame)
+                except (ValueError, IndexError):
+                    values = None
+                if values is None:
+                    self.errors += 1
+                else:
+                    samples.append(values)
+        if samples:
+            self.current_values = samples[-1]
+            self.samples += len(samples)
+            self.last_sample = time.time()
+        return samples
+
+    def close(self):
+        self.connected = False
+        if self.connection is not None and self.connection.is_open:
+            self.connection.close()
+
+
+class LinkEngine(QObject):
+    """Reads every link from one thread and fans samples out by link ID"""
+    status_update = pyqtSignal(str)
+    link_lost = pyqtSignal(str)  # Link ID whose port failed or closed
+
+    def __init__(self):
+        super().__init__()
+        self.links = {}
+        self.sinks = []  # Callables taking (link_id, values, arrival)
+        self._selector = selectors.DefaultSelector()
+        self._polled = []
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def add_link(self, link_id, port=None, connection=None, frame_format='ascii',
+                 baudrate=57600, sink=None):
+        """
+        Register a link; it is opened when the engine starts (or at once if running)
+        Returns:
+            TelemetryLink: The new link
+        """
+        link = TelemetryLink(link_id, port, connection, frame_format, baudrate, sink)
+        with self._lock:
+            self.links[link_id] = link
+            if self._running:
+                self._open_link(link)
+        return link
+
+    def add_sink(self, sink):
+        """Receive every sample from every link as sink(link_id, values, arrival)"""
+        self.sinks.append(sink)
+
+    def _open_link(self, link):
+        try:
+            link.open()
+        except serial.SerialException as e:
+            self.status_update.emit(f"{link.link_id}: {str(e)}")
+            return
+        fd = link.fileno()
+        if fd is None:
+            self._polled.append(link)
+        else:
+            self._selector.register(fd, selectors.EVENT_READ, link)
+        self.status_update.emit(f"{link.link_id}: connected to {link.port or 'connection'}")
+
+    def _drop_link(self, link, reason):
+        with self._lock:
+            fd = link.fileno()
+            if fd is not None and link.connected:
+                try:
+                    self._selector.unregister(fd)
+                except (KeyError, ValueError):
+                    pass
+            if link in self._polled:
+                self._polled.remove(link)
+            link.close()
+        self.status_update.emit(f"{link.link_id}: {reason}")
+        self.link_lost.emit(link.link_id)
+
+    def start(self):
+        self._running = True
+        with self._lock:
+            for link in self.links.values():
+                self._open_link(link)
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        with self._lock:
+            for link in self.links.values():
+                link.close()
+        self._selector.close()
+
+    def _read(self, link):
+        conn = link.connection
+        try:
+            waiting = conn.in_waiting
+            chunk = conn.read(waiting or 1)
+        except (serial.SerialException, OSError) as e:
+            self._drop_link(link, f"link lost ({str(e)})")
+            return
+        if not chunk:
+            return
+        arrival = time.perf_counter()
+        for values in link.feed(chunk):
+            if link.sink is not None:
+                link.sink(values, arrival)
+            for sink in self.sinks:
+                sink(link.link_id, values, arrival)
+
+    def run(self):
+        """Engine thread: wait on every selectable port, poll the rest"""
+        while self._running:
+            with self._lock:
+                polled = list(self._polled)
+            timeout = POLL_INTERVAL if polled else 0.2
+            if self._selector.get_map():
+                events = self._selector.select(timeout)
+            else:
+                events = []
+                time.sleep(timeout)
+            for key, _ in events:
+                self._read(key.data)
+            for link in polled:
+                self._read(link)  # Non-blocking, returns at once when idle
+
+    def stats(self):
+        """{link_id: {'bytes', 'samples', 'errors', 'connected'}}"""
+        with self._lock:
+            return {link_id: {'bytes': link.bytes, 'samples': link.samples,
+                              'errors': link.errors, 'connected': link.connected}
+                    for link_id, link in self.links.items()}
+
+
+class LinkTable(QTableWidget):
+    """One row per link with its newest sample, refreshed at refresh_hz"""
+    COLUMNS = ('Link', *(field.label for field in FIELDS), 'Samples')
+
+    def __init__(self, refresh_hz=10, parent=None):
+        super().__init__(0, len(self.COLUMNS), parent)
+        self.setHorizontalHeaderLabels(self.COLUMNS)
+        self.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.verticalHeader().setVisible(False)
+        self._lock = threading.Lock()
+        self._latest = {}  # link_id -> (values, count)
+        self._rows = {}
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.refresh)
+        self._timer.start(max(1, int(round(1000 / refresh_hz))))
+
+    def submit(self, link_id, values, arrival=None):
+        """Engine sink: keep the newest sample per link (any thread)"""
+        with self._lock:
+            _, count = self._latest.get(link_id, (None, 0))
+            self._latest[link_id] = (values, count + 1)
+
+    def refresh(self):
+        with self._lock:
+            latest = dict(self._latest)
+        for link_id, (values, count) in latest.items():
+            row = self._rows.get(link_id)
+            if row is None:
+                row = self._rows[link_id] = self.rowCount()
+                self.insertRow(row)
+                self.setItem(row, 0, QTableWidgetItem(str(link_id)))
+            cells = [field.text(value) for field, value in zip(FIELDS, values)]
+            cells.append(str(count))
+            for column, text in enumerate(cells, start=1):
+                item = self.item(row, column)
+                if item is None:
+                    self.setItem(row, column, QTableWidgetItem(text))
+                elif item.text() != text:
+                    item.setText(text)
+
+
+def main():
+    from serial_sim import SimulatedLink, synthetic_frames
+
+    parser = argparse.ArgumentParser(description="Multi-link telemetry engine")
+    parser.add_argument('--link', action='append', default=[], metavar='ID=PORT',
+                        help="link to read (repeatable)")
+    parser.add_argument('--simulate', type=int, default=0, metavar='N',
+                        help="add N simulated vehicles on pseudo-terminals")
+    parser.add_argument('--rate', type=float, default=50, help="packets/s per simulated link")
+    parser.add_argument('--binary', action='store_true', help="simulated links send binary frames")
+    parser.add_argument('--seconds', type=float, default=10, help="run time")
+    args = parser.parse_args()
+
+    engine = LinkEngine()
+    engine.status_update.connect(print, Qt.DirectConnection)  # No event loop here
+    for spec in args.link:
+        link_id, _, port = spec.partition('=')
+        engine.add_link(link_id, port)
+    frame_format = 'binary' if args.binary else 'ascii'
+    simulated = []
+    for index in range(args.simulate):
+        link = SimulatedLink(synthetic_frames(args.rate, frame_format=frame_format))
+        link.open()
+        simulated.append(link)
+        engine.add_link(f"sim{index}", link.port, frame_format=frame_format)
+
+    threads_before = threading.active_count()
+    engine.start()
+    print(f"{len(engine.links)} links read by "
+          f"{threading.active_count() - threads_before} engine thread(s)")
+    for link in simulated:
+        link.start()
+
+    previous = sum(s['samples'] for s in engine.stats().values())
+    cpu = time.process_time()
+    started = time.perf_counter()
+    try:
+        while time.perf_counter() - started < args.seconds:
+            time.sleep(1)
+            stats = engine.stats()
+            total = sum(s['samples'] for s in stats.values())
+            errors = sum(s['errors'] for s in stats.values())
+            used = time.process_time() - cpu
+            cpu = time.process_time()
+            # CPU is for the whole process, simulators included
+            print(f"{total - previous} samples/s across {len(stats)} links, "
+                  f"{errors} errors, process CPU {used * 100:.0f}%")
+            previous = total
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.stop()
+        for link in simulated:
+            link.stop()
+
+
+if __name__ == "__main__":
+    main()
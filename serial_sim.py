@@ -0,0 +1,287 @@
+"""
+Hardware-free stand-in for the Arduino telemetry link.
+
+SimulatedLink plays a stream of frames into a pseudo-terminal (Linux/macOS)
+or a pyserial loop:// port at a configurable multiple of real time, so
+SerialProcessor, the UI pipeline and check_windows_serial.py can be run and
+load-tested without a radio attached. Commands written back by the
+application are collected in SimulatedLink.commands (on loop:// they are
+taken off the port instead of echoing into the reader); with ack=True every
+COMMAND#seq is answered with a $ACK,seq line like the firmware does.
+
+    python serial_sim.py --speed 10
+    python check_windows_serial.py --port /dev/pts/N
+"""
+import argparse
+import math
+import os
+import queue
+import re
+import select
+import threading
+import time
+import serial
+from serial.urlhandler.protocol_loop import Serial as LoopSerial
+from binary_frames import encode_frame
+from flight_recorder import FlightLog
+from telemetry_schema import FIELDS, format_frame
+
+COMMAND_SEQ = re.compile(rb'#(\d+)\n')
+LOOP_BAUDRATE = 4000000  # loop:// times writes by baud rate; keep that out of the way
+
+
+def synthetic_frames(rate_hz=50, count=None, frame_format='ascii'):
+    """
+    Generate a plausible flight: climb, cruise with oscillating tilt, descend
+    Yields:
+        (seconds_from_start, frame_bytes)
+    """
+    seq = 0
+    while count is None or seq < count:
+        t = seq / rate_hz
+        phase = (t % 120) / 120  # Two-minute flight profile, repeated
+        height = int(25 * math.sin(math.pi * phase))
+        speed = int(5 + 4 * math.sin(2 * math.pi * t / 20))
+        tilt = int(40 * math.sin(2 * math.pi * t / 8))
+        value = round(12.6 - 0.001 * t % 2.0, 2)
+        status = 'F' if height > 0 else 'L'
+        sample = {'height': height, 'speed': speed, 'tilt': tilt,
+                  'value': value, 'status': status}
+        values = [sample.get(field.name, field.default) for field in FIELDS]
+        if frame_format == 'binary':
+            frame = encode_frame(values, seq)
+        else:
+            frame = format_frame(values).encode('ascii')
+        yield t, frame
+        seq += 1
+
+
+def text_log_frames(path, rate_hz=50):
+    """Replay a text dump of $... lines, spaced at rate_hz"""
+    with open(path, 'rb') as f:
+        for index, line in enumerate(f):
+            line = line.strip()
+            if line:
+                yield index / rate_hz, line + b'\n'
+
+
+def flight_log_frames(path):
+    """Replay a flight_recorder log with its original timing"""
+    log = FlightLog(path)
+    if not len(log):
+        return
+    start = log.start_time
+    for index in range(len(log)):
+        frame = log.raw_frame(index)
+        if frame.startswith(b'$') and not frame.endswith(b'\n'):
+            frame += b'\n'  # Text frames are stored without their terminator
+        yield float(log.records['time'][index]) - start, frame
+
+
+class LoopPort(LoopSerial):
+    """loop:// port whose application writes go to the link, not back to the reader"""
+
+    def __init__(self, link, *args, **kwargs):
+        self.link = link
+        super().__init__(*args, **kwargs)
+
+    def write(self, data):
+        data = bytes(data)
+        self.link._received(data)
+        return len(data)
+
+    def inject(self, data):
+        """
+        Queue bytes for the reader (the drone side of the link), waiting while
+        it catches up rather than failing on the application's write_timeout
+        """
+        for byte in serial.iterbytes(data):
+            while True:
+                if not self.is_open:
+                    raise serial.PortNotOpenError()
+                try:
+                    self.queue.put(byte, timeout=0.2)
+                    break
+                except queue.Full:
+                    if not self.link._running:
+                        raise serial.SerialException("loop:// reader stopped")
+        return len(data)
+
+
+class SimulatedLink:
+    """Feeds frames to a virtual serial port at speed x real time (0 = flat out)"""
+
+    def __init__(self, frames, speed=1.0, use_loop=False, ack=False):
+        self.frames = frames
+        self.speed = speed
+        self.ack = ack  # Answer sequence-numbered commands with $ACK,seq
+        self.use_loop = use_loop or not hasattr(os, 'openpty')
+        self.port = None        # Device path (pty) or URL (loop://) to open
+        self.connection = None  # Shared serial object in loop:// mode
+        self.commands = []      # Bytes written back by the application
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.error = None       # Exception that stopped the frame writer early
+        self._running = False   # Between start() and stop()
+        self._writing = False   # Frames left to send
+        self._send_lock = threading.Lock()  # Frames and acks come from two threads
+        self._master = None
+        self._slave = None
+        self._threads = []
+        self._pending = b''  # Command bytes after the last newline
+
+    def open(self):
+        """Create the virtual port; self.port is valid afterwards"""
+        if self.use_loop:
+            self.connection = LoopPort(self, 'loop://', baudrate=LOOP_BAUDRATE, timeout=0.2)
+            self.port = 'loop://'
+        else:
+            import tty
+            self._master, self._slave = os.openpty()
+            tty.setraw(self._slave)  # No echo or newline translation on binary frames
+            self.port = os.ttyname(self._slave)
+        return self.port
+
+    def start(self):
+        """Open the port if needed and start replaying in the background"""
+        if self.port is None:
+            self.open()
+        self._running = self._writing = True
+        self._threads = [threading.Thread(target=self._write_frames, daemon=True)]
+        if not self.use_loop:
+            self._threads.append(threading.Thread(target=self._read_commands, daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def send(self, data):
+        """Write bytes to the application side immediately"""
+        with self._send_lock:
+            if self.use_loop:
+                self.connection.inject(data)
+            else:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(self._master, view):]
+
+    def _write_frames(self):
+        started = time.perf_counter()
+        pending = []
+        try:
+            for offset, frame in self.frames:
+                if not self._running:
+                    break
+                if self.speed > 0:
+                    due = started + offset / self.speed
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        if pending:
+                            self._flush(pending)
+                        time.sleep(delay)
+                pending.append(frame)
+                if len(pending) >= 64:  # Flat out or late: batch the writes
+                    self._flush(pending)
+            if pending:
+                self._flush(pending)
+        except (OSError, queue.Full) as e:
+            if self._running:  # Not just the port closing in stop()
+                self.error = e
+                print(f"Simulated link stopped after {self.frames_sent} frames: {e!r}")
+        self._writing = False
+
+    def _flush(self, pending):
+        data = b''.join(pending)
+        self.send(data)
+        self.frames_sent += len(pending)
+        self.bytes_sent += len(data)
+        pending.clear()
+
+    def _read_commands(self):
+        while self._running:
+            try:
+                readable, _, _ = select.select([self._master], [], [], 0.2)
+                if readable:
+                    self._received(os.read(self._master, 1024))
+            except (OSError, ValueError):
+                break
+
+    def _received(self, data):
+        """Bytes written by the application: record them, ack complete commands"""
+        self.commands.append(data)
+        if self.ack:
+            self._pending += data
+            end = self._pending.rfind(b'\n') + 1
+            for seq in COMMAND_SEQ.findall(self._pending[:end]):
+                self.send(b'$ACK,' + seq + b'\n')
+            self._pending = self._pending[end:]
+
+    @property
+    def running(self):
+        """Frames are still being sent (commands are handled until stop())"""
+        return self._writing
+
+    def wait(self, timeout=None):
+        """Block until every frame has been written; raises what stopped the writer"""
+        self._threads[0].join(timeout)
+        if self.error is not None:
+            raise self.error
+
+    def stop(self):
+        self._running = False
+        for thread in self._threads:
+            thread.join(timeout=1)
+        if self.use_loop:
+            if self.connection is not None:
+                self.connection.close()
+        else:
+            for fd in (self._master, self._slave):
+                if fd is not None:
+                    os.close(fd)
+            self._master = self._slave = None
+
+
+def frames_from_args(args):
+    """Frame source selected on the command line"""
+    if args.replay:
+        if args.replay.endswith('.bin'):
+            return flight_log_frames(args.replay)
+        return text_log_frames(args.replay, args.rate)
+    return synthetic_frames(args.rate, args.count, 'binary' if args.binary else 'ascii')
+
+
+def add_simulation_args(parser):
+    """Options shared by every tool that can run against a simulated link"""
+    parser.add_argument('--replay', metavar='LOG',
+                        help="replay a flight log (.bin) or $... text dump")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="rate multiplier over real time, 0 = as fast as possible")
+    parser.add_argument('--rate', type=float, default=50,
+                        help="packets per second for synthetic or text streams")
+    parser.add_argument('--count', type=int, help="stop after this many synthetic packets")
+    parser.add_argument('--binary', action='store_true',
+                        help="binary frames instead of $... text lines (synthesised when simulating)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated drone telemetry link")
+    add_simulation_args(parser)
+    parser.add_argument('--loop', action='store_true', help="use loop:// instead of a pty")
+    parser.add_argument('--ack', action='store_true',
+                        help="acknowledge COMMAND#seq commands with $ACK,seq")
+    args = parser.parse_args()
+
+    link = SimulatedLink(frames_from_args(args), args.speed, args.loop, args.ack)
+    print(f"Simulated link on {link.open()}")
+    link.start()
+    try:
+        while link.running:
+            time.sleep(1)
+            print(f"{link.frames_sent} frames, {link.bytes_sent} bytes sent, "
+                  f"{len(link.commands)} commands received")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        link.stop()
+
+
+if __name__ == "__main__":
+    main()
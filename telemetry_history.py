@@ -0,0 +1,124 @@
+"""
+Fixed-capacity history of timestamped telemetry samples.
+
+Samples live in one preallocated NumPy structured array used as a ring
+buffer, so memory stays constant however long the flight runs and
+window queries are vectorized slices instead of Python loops.
+
+Times are time.monotonic(), so the binary searches behind window queries
+stay valid when the wall clock is stepped (NTP, DST); wall_time()
+converts them for display.
+"""
+import threading
+import time
+import numpy as np
+from telemetry_schema import numpy_fields
+
+SAMPLE_DTYPE = np.dtype(
+    [('time', 'f8')]  # time.monotonic() when the sample was received
+    + numpy_fields('i4', 'f8', 'U1'))
+# (position in a sample, min, max) of every integer field
+INT_LIMITS = [(index - 1, int(np.iinfo(SAMPLE_DTYPE[index]).min),
+               int(np.iinfo(SAMPLE_DTYPE[index]).max))
+              for index in range(1, len(SAMPLE_DTYPE))
+              if SAMPLE_DTYPE[index].kind == 'i']
+
+DEFAULT_CAPACITY = 60 * 60 * 50  # One hour at 50 Hz, ~5.8 MB
+
+
+class TelemetryHistory:
+    """Ring buffer of the most recent `capacity` samples"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=SAMPLE_DTYPE)
+        self._next = 0   # Slot the next sample is written to
+        self._count = 0
+        self._lock = threading.Lock()
+        self.rejected = 0  # Samples with integers that don't fit the dtype
+        # Offset from the monotonic clock to wall time, for display
+        self.wall_offset = time.time() - time.monotonic()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes
+
+    def append(self, values, timestamp=None):
+        """
+        Store one sample, overwriting the oldest once full
+        Args:
+            values (list): Sample in telemetry_schema field order
+            timestamp (float): Receive time, defaults to time.monotonic()
+        Returns:
+            bool: False if the sample was rejected (an integer out of range)
+        """
+        for index, low, high in INT_LIMITS:
+            if not low <= values[index] <= high:
+                self.rejected += 1
+                return False
+        if timestamp is None:
+            timestamp = time.monotonic()
+        with self._lock:
+            self._data[self._next] = (timestamp, *values)
+            self._next = (self._next + 1) % self.capacity
+            if self._count < self.capacity:
+                self._count += 1
+        return True
+
+    def wall_time(self, times):
+        """Stored monotonic times (scalar or array) as time.time() values"""
+        return times + self.wall_offset
+
+    def clear(self):
+        with self._lock:
+            self._next = 0
+            self._count = 0
+
+    def _segments(self):
+        """Oldest-first views of the stored samples (no copies)"""
+        if self._count < self.capacity:
+            return (self._data[:self._count],)
+        return (self._data[self._next:], self._data[:self._next])
+
+    def snapshot(self):
+        """All stored samples, oldest first, as a new array"""
+        with self._lock:
+            return np.concatenate(self._segments())
+
+    def last(self, n):
+        """The newest n samples, oldest first"""
+        with self._lock:
+            n = min(n, self._count)
+            if n == 0:
+                return np.empty(0, dtype=SAMPLE_DTYPE)
+            end = self._next
+            start = end - n  # Negative when the window wraps around
+            if start >= 0:
+                return self._data[start:end].copy()
+            return np.concatenate((self._data[start:], self._data[:end]))
+
+    def since(self, start_time):
+        """Samples received at or after start_time (time.monotonic()), oldest first"""
+        with self._lock:
+            parts = []
+            for segment in self._segments():
+                # Each segment is in arrival order, so a binary search finds the cut
+                index = np.searchsorted(segment['time'], start_time, side='left')
+                parts.append(segment[index:])
+            return np.concatenate(parts)
+
+    def window(self, seconds, now=None):
+        """Samples from the last `seconds` seconds, oldest first"""
+        if now is None:
+            now = time.monotonic()
+        return self.since(now - seconds)
+
+    def latest(self):
+        """The newest sample, or None when empty"""
+        with self._lock:
+            if self._count == 0:
+                return None
+            return self._data[self._next - 1].copy()
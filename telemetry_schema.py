@@ -0,0 +1,154 @@
+"""
+The telemetry packet layout, declared once.
+
+    $height,speed,tilt,value,status\n
+
+FIELDS lists every comma-separated field with its type, display label,
+unit and range. Everything that handles packets derives from it:
+
+    parse_frame       the text parser, generated once for this layout
+    format_frame      the text wire form (the simulator sends these)
+    struct_format     binary payload and flight log record layouts
+    numpy_fields      history, flight log and bulk parser dtypes
+    Field.text        wire, LinkTable and console formatting
+    Field.format      DataDisplay labels (display precision, with unit)
+
+Adding a telemetry field means adding a Field here (and to the firmware).
+"""
+
+FRAME_START = '$'
+SEPARATOR = ','
+KINDS = ('int', 'float', 'char')
+
+
+class Field:
+    """One comma-separated telemetry field"""
+    __slots__ = ('name', 'kind', 'label', 'unit', 'minimum', 'maximum', 'decimals',
+                 'display_decimals')
+
+    def __init__(self, name, kind, label, unit='', minimum=None, maximum=None, decimals=2,
+                 display_decimals=None):
+        """
+        Args:
+            name (str): Identifier used for columns and dtypes
+            kind (str): 'int', 'float' or 'char' (one character, may be empty)
+            label (str): Display name
+            unit (str): Display unit
+            minimum, maximum: Expected range; gauges span it (not enforced)
+            decimals (int): Digits after the point for float text
+            display_decimals (int): Digits shown in labels, decimals by default
+        """
+        if kind not in KINDS:
+            raise ValueError(f"{name}: unknown field kind {kind!r}")
+        self.name = name
+        self.kind = kind
+        self.label = label
+        self.unit = unit
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decimals = decimals
+        self.display_decimals = decimals if display_decimals is None else display_decimals
+
+    @property
+    def default(self):
+        return {'int': 0, 'float': 0.0, 'char': ''}[self.kind]
+
+    def text(self, value):
+        """Value as sent on the wire and shown in tables"""
+        if self.kind == 'float':
+            return f"{value:.{self.decimals}f}"
+        return str(value)
+
+    def format(self, value):
+        """Value with its unit, for labels"""
+        if self.kind == 'float':
+            return f"{value:.{self.display_decimals}f}{self.unit}"
+        return self.text(value) + self.unit
+
+
+FIELDS = (
+    Field('height', 'int', 'Height', 'm', 0, 30),
+    Field('speed', 'int', 'Speed', 'm/s', 0, 10),
+    Field('tilt', 'int', 'Tilt', '°', -45, 45),
+    Field('value', 'float', 'Value', display_decimals=1),
+    Field('status', 'char', 'Status'),  # F flying, L landed
+)
+FIELD_NAMES = tuple(field.name for field in FIELDS)
+FIELD_INDEX = {field.name: index for index, field in enumerate(FIELDS)}
+FIELD_BY_NAME = {field.name: field for field in FIELDS}
+
+
+def compile_parser(fields=FIELDS):
+    """
+    Generate the text parser for a layout (done once, at import)
+
+    The generated function unpacks the split line straight into locals and
+    converts each one inline: no loop over fields, no per-field dispatch.
+    Returns:
+        function: parse_frame(data_string) -> list or None; None if the line
+        is not a frame of this layout, ValueError on a malformed field
+    """
+    names = [f"f{index}" for index in range(len(fields))]
+    converters = {'int': 'int({})', 'float': 'float({})', 'char': '{}[:1]'}
+    values = ", ".join(converters[field.kind].format(name)
+                       for field, name in zip(fields, names))
+    source = (
+        "def parse_frame(data_string):\n"
+        f"    if not data_string.startswith({FRAME_START!r}):\n"
+        "        return None\n"
+        "    try:\n"
+        f"        {', '.join(names)}, = "
+        f"data_string[{len(FRAME_START)}:].strip().split({SEPARATOR!r})\n"
+        "    except ValueError:\n"
+        "        return None  # Wrong number of fields\n"
+        f"    return [{values}]\n"
+    )
+    namespace = {}
+    exec(compile(source, f"<telemetry_schema {','.join(f.name for f in fields)}>", 'exec'),
+         namespace)
+    parser = namespace['parse_frame']
+    parser.__doc__ = f"Parse one {FRAME_START}{SEPARATOR.join(f.kind for f in fields)} frame"
+    parser.source = source
+    return parser
+
+
+parse_frame = compile_parser()
+
+
+def default_values():
+    """Sample shown before the first packet arrives"""
+    return [field.default for field in FIELDS]
+
+
+def format_frame(values):
+    """Text wire form of a sample, newline included"""
+    return FRAME_START + SEPARATOR.join(
+        field.text(value) for field, value in zip(FIELDS, values)) + "\n"
+
+
+def struct_format(int_code, float_code):
+    """
+    struct codes for the fields, chars as one byte ('c')
+    Args:
+        int_code, float_code (str): Codes for int and float fields, e.g. 'h', 'f'
+    """
+    return ''.join({'int': int_code, 'float': float_code, 'char': 'c'}[field.kind]
+                   for field in FIELDS)
+
+
+def pack_values(values):
+    """Sample as struct arguments: chars as one byte, b'\\x00' when empty"""
+    return tuple(value.encode('ascii', 'replace')[:1] or b'\x00' if field.kind == 'char'
+                 else value for field, value in zip(FIELDS, values))
+
+
+def unpack_values(fields):
+    """Inverse of pack_values"""
+    return [('' if value == b'\x00' else value.decode('ascii', 'replace'))
+            if field.kind == 'char' else value for field, value in zip(FIELDS, fields)]
+
+
+def numpy_fields(int_dtype, float_dtype, char_dtype):
+    """[(name, dtype)] for a structured dtype holding one sample"""
+    dtypes = {'int': int_dtype, 'float': float_dtype, 'char': char_dtype}
+    return [(field.name, dtypes[field.kind]) for field in FIELDS]
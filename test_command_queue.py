@@ -0,0 +1,67 @@
+import threading
+import time
+import serial
+from command_queue import CommandQueue, CommandTracker
+from functions import SerialProcessor
+
+
+def drain(queue):
+    commands = []
+    while True:
+        entry = queue.get(timeout=0)
+        if entry is None:
+            return commands
+        commands.append(entry.command)
+
+
+def test_land_cancels_queued_takeoff():
+    queue = CommandQueue()
+    queue.put("CMD:TAKEOFF")
+    queue.put("CMD:LAND")
+    assert drain(queue) == ["CMD:LAND"]
+    assert queue.preempted == 1
+
+
+def test_commands_after_land_keep_their_order():
+    queue = CommandQueue()
+    queue.put("DIR:UP")
+    queue.put("CMD:LAND")
+    queue.put("CMD:TAKEOFF")
+    assert drain(queue) == ["CMD:LAND", "CMD:TAKEOFF"]
+
+
+def test_land_stops_takeoff_retries():
+    tracker = CommandTracker(timeout=0.1)
+    assert tracker.sending("CMD:TAKEOFF", 1, now=0.0)
+    assert tracker.sending("CMD:LAND", 2, now=0.05)
+    retry, failed = tracker.expired(now=1.0)
+    assert [p.command for p in retry] == ["CMD:LAND"]
+    assert not tracker.sending("CMD:TAKEOFF", 1, retry=True, now=1.0)
+
+
+def test_land_is_held_while_reconnecting():
+    processor = SerialProcessor(connection=None)
+    messages = []
+    processor.status_update.connect(messages.append)
+    failed = []
+    processor.command_failed.connect(failed.append)
+
+    processor.send_command("DIR:UP")  # Stale once the link is back: refused
+    processor.send_command("CMD:LAND")
+    writer = threading.Thread(target=processor._write_commands, daemon=True)
+    writer.start()
+    time.sleep(0.2)
+    assert not any("NoneType" in message for message in messages)
+
+    port = serial.serial_for_url('loop://', timeout=0.2)
+    processor.serial_conn = port
+    deadline = time.monotonic() + 2
+    received = b''
+    while len(received) < len(b'CMD:LAND') and time.monotonic() < deadline:
+        received += port.read(64)
+    processor.stop()
+    processor.commands.close()
+    writer.join(2)
+    port.close()
+    assert received == b'CMD:LAND'
+    assert failed == []
@@ -0,0 +1,62 @@
+import threading
+import time
+import serial
+import functions
+from functions import SerialProcessor
+from link_supervisor import LinkSupervisor
+
+
+class FailingPort:
+    """Opens fine, then every read fails (unplugged mid-handshake, stale port cache)"""
+    opens = 0
+
+    def __init__(self, *args, **kwargs):
+        FailingPort.opens += 1
+        self.is_open = True
+        self.in_waiting = 0
+
+    def read(self, size=1):
+        raise serial.SerialException("device reports readiness to read but returned no data")
+
+    def readline(self):
+        return self.read()
+
+    def close(self):
+        self.is_open = False
+
+
+def test_port_failing_straight_away_counts_as_failed_attempt():
+    supervisor = LinkSupervisor(locator=object())
+    for attempt in range(1, 4):
+        supervisor.opened()
+        supervisor.lost()
+        assert supervisor.attempts == attempt
+    assert supervisor.next_delay() > 0
+    assert not supervisor.ever_connected
+
+
+def test_valid_frame_resets_backoff():
+    supervisor = LinkSupervisor(locator=object())
+    supervisor.opened()
+    supervisor.lost()
+    supervisor.opened()
+    supervisor.connected()
+    supervisor.lost()
+    assert supervisor.attempts == 0
+    assert supervisor.next_delay() == 0
+
+
+def test_reader_backs_off_from_port_that_opens_then_raises(monkeypatch):
+    monkeypatch.setattr(functions.serial, 'serial_for_url', FailingPort)
+    FailingPort.opens = 0
+    processor = SerialProcessor(port='/dev/ttyFAKE')
+    messages = []
+    processor.status_update.connect(messages.append)
+    reader = threading.Thread(target=processor.run, daemon=True)
+    reader.start()
+    time.sleep(1.0)
+    processor.stop()
+    reader.join(3)
+    # 50 ms doubling to 2 s: a handful of attempts, not a busy loop
+    assert 2 <= FailingPort.opens <= 8
+    assert len(messages) <= 6
@@ -0,0 +1,61 @@
+"""
+Serves map tiles to QtWebEngine through a custom `tiles:` URL scheme,
+so Leaflet loads tiles from a tile_store source instead of thousands of
+individual file:// requests.
+
+register_tile_scheme() must run before the QApplication is created.
+"""
+from PyQt5.QtCore import QBuffer, QIODevice
+from PyQt5.QtWebEngineCore import (QWebEngineUrlScheme, QWebEngineUrlSchemeHandler,
+                                   QWebEngineUrlRequestJob)
+
+SCHEME = b'tiles'
+TILE_URL = 'tiles:{z}/{x}/{y}.png'  # Leaflet tile layer template
+
+
+def register_tile_scheme():
+    """Declare the tiles: scheme to Chromium (before QApplication exists)"""
+    scheme = QWebEngineUrlScheme(SCHEME)
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Path)
+    scheme.setFlags(QWebEngineUrlScheme.SecureScheme |
+                    QWebEngineUrlScheme.LocalAccessAllowed |
+                    QWebEngineUrlScheme.CorsEnabled)
+    QWebEngineUrlScheme.registerScheme(scheme)
+
+
+class TileSchemeHandler(QWebEngineUrlSchemeHandler):
+    def __init__(self, source, parent=None):
+        """
+        Args:
+            source: Object with get_tile(zoom, x, y) -> bytes or None
+        """
+        super().__init__(parent)
+        self.source = source
+        self.served = 0
+        self.not_found = 0
+
+    def requestStarted(self, job):
+        """Answer tiles:{z}/{x}/{y}.png from the tile source"""
+        try:
+            zoom, x, y = job.requestUrl().path().strip('/').rsplit('.', 1)[0].split('/')
+            data = self.source.get_tile(int(zoom), int(x), int(y))
+        except ValueError:
+            job.fail(QWebEngineUrlRequestJob.UrlInvalid)
+            return
+        if data is None:
+            self.not_found += 1
+            job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+            return
+
+        buffer = QBuffer(job)  # Owned by the job, freed with it
+        buffer.setData(data)
+        buffer.open(QIODevice.ReadOnly)
+        job.reply(b'image/png', buffer)
+        self.served += 1
+
+
+def install_tile_handler(web_view, source):
+    """Route the web view's tiles: requests to `source`"""
+    handler = TileSchemeHandler(source, web_view)
+    web_view.page().profile().installUrlSchemeHandler(SCHEME, handler)
+    return handler
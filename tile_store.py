@@ -0,0 +1,378 @@
+"""
+Tile sources for the offline map.
+
+MBTilesStore packs a whole tile set into one SQLite file using the
+MBTiles layout (metadata table plus a `tiles` view over content-addressed
+`images` and a `map` index, so identical tiles are stored once).
+DirectoryTileSource reads the older tiles/{z}/{x}/{y}.png tree. Both
+expose get_tile(zoom, x, y) with XYZ (slippy map) coordinates, and
+TileCache keeps recently served tiles in memory in front of either.
+"""
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+DEFAULT_STORE = "tiles.mbtiles"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS images (tile_id TEXT PRIMARY KEY, tile_data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS map (
+    zoom_level INTEGER NOT NULL,
+    tile_column INTEGER NOT NULL,
+    tile_row INTEGER NOT NULL,
+    tile_id TEXT NOT NULL,
+    PRIMARY KEY (zoom_level, tile_column, tile_row)
+);
+CREATE VIEW IF NOT EXISTS tiles AS
+    SELECT map.zoom_level AS zoom_level, map.tile_column AS tile_column,
+           map.tile_row AS tile_row, images.tile_data AS tile_data
+    FROM map JOIN images ON images.tile_id = map.tile_id;
+CREATE TABLE IF NOT EXISTS tile_manifest (
+    zoom_level INTEGER NOT NULL,
+    tile_column INTEGER NOT NULL,
+    tile_row INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    checked_at REAL,
+    PRIMARY KEY (zoom_level, tile_column, tile_row)
+);
+"""
+
+
+def content_hash(data):
+    """Identity of a tile image, shared by the store and the manifest"""
+    return hashlib.sha1(data).hexdigest()
+
+
+def tile_position(lat, lon, zoom):
+    """Fractional slippy-map tile coordinates of a point (integer part is the tile)"""
+    n = 2 ** zoom
+    x = (lon + 180.0) / 360.0 * n
+    y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+    return x, y
+
+
+def lat_lon_to_tile(lat, lon, zoom):
+    """Slippy-map tile (x, y) containing a coordinate at a zoom level"""
+    x, y = tile_position(lat, lon, zoom)
+    return int(x), int(y)
+
+
+def tms_row(zoom, y):
+    """MBTiles rows count from the bottom (TMS), slippy map y from the top"""
+    return (1 << zoom) - 1 - y
+
+
+class MBTilesStore:
+    """Single-file tile store, safe to share between threads"""
+
+    def __init__(self, path=DEFAULT_STORE, readonly=False, commit_every=200):
+        self.path = path
+        self.readonly = readonly
+        self.commit_every = commit_every
+        self._uncommitted = 0
+        self._lock = threading.Lock()
+        if readonly:
+            uri = f"file:{os.path.abspath(path)}?mode=ro"
+            self._db = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")  # Readers don't block the writer
+            self._db.executescript(SCHEMA)
+            self._db.execute("INSERT OR IGNORE INTO metadata VALUES ('name', 'offline tiles')")
+            self._db.execute("INSERT OR IGNORE INTO metadata VALUES ('format', 'png')")
+            self._db.commit()
+
+    def get_tile(self, zoom, x, y):
+        """Tile bytes, or None if the store doesn't have it"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?",
+                (zoom, x, tms_row(zoom, y))).fetchone()
+        return row[0] if row else None
+
+    def has_tile(self, zoom, x, y):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM map WHERE zoom_level=? AND tile_column=? AND tile_row=?",
+                (zoom, x, tms_row(zoom, y))).fetchone()
+        return row is not None
+
+    def put_tile(self, zoom, x, y, data):
+        """Store (or replace) a tile; identical images are kept once"""
+        tile_id = content_hash(data)
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO images VALUES (?, ?)", (tile_id, data))
+            self._db.execute("INSERT OR REPLACE INTO map VALUES (?, ?, ?, ?)",
+                             (zoom, x, tms_row(zoom, y), tile_id))
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every:
+                self._db.commit()
+                self._uncommitted = 0
+        return tile_id
+
+    def has_image(self, tile_id):
+        """True if an identical image is already stored (it would be shared)"""
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM images WHERE tile_id=?", (tile_id,)).fetchone()
+        return row is not None
+
+    def get_manifest(self, zoom, x, y):
+        """(etag, last_modified, content_hash) recorded for a tile, or None"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT etag, last_modified, content_hash FROM tile_manifest "
+                "WHERE zoom_level=? AND tile_column=? AND tile_row=?",
+                (zoom, x, tms_row(zoom, y))).fetchone()
+
+    def update_manifest(self, zoom, x, y, etag, last_modified, tile_hash, checked_at):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO tile_manifest VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (zoom, x, tms_row(zoom, y), etag, last_modified,
+                              tile_hash, checked_at))
+
+    def prune_images(self):
+        """Delete images no tile refers to any more (after refreshes); returns the count"""
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM images WHERE tile_id NOT IN (SELECT tile_id FROM map)")
+            self._db.commit()
+            self._uncommitted = 0
+            return cursor.rowcount
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+            self._uncommitted = 0
+
+    def set_metadata(self, name, value):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO metadata VALUES (?, ?)", (name, str(value)))
+            self._db.commit()
+
+    def metadata(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT name, value FROM metadata"))
+
+    def zoom_counts(self):
+        """{zoom: tile count}"""
+        with self._lock:
+            return dict(self._db.execute(
+                "SELECT zoom_level, COUNT(*) FROM map GROUP BY zoom_level ORDER BY zoom_level"))
+
+    def check_header(self):
+        """
+        Cheap sanity check for startup: index lookups only, whatever the file size
+        Returns:
+            dict: ok, missing tables, minzoom and maxzoom (None when empty)
+        """
+        with self._lock:
+            names = {row[0] for row in self._db.execute("SELECT name FROM sqlite_master")}
+            missing = sorted({'metadata', 'images', 'map', 'tiles'} - names)
+            minzoom = maxzoom = None
+            if 'map' in names:
+                # Both use the primary key index
+                minzoom = self._db.execute("SELECT MIN(zoom_level) FROM map").fetchone()[0]
+                maxzoom = self._db.execute("SELECT MAX(zoom_level) FROM map").fetchone()[0]
+        return {
+            'ok': not missing and minzoom is not None,
+            'missing': missing,
+            'minzoom': minzoom,
+            'maxzoom': maxzoom,
+        }
+
+    def check_integrity(self):
+        """
+        Full consistency report (reads the whole file; map_utils --check)
+        Returns:
+            dict: ok, sqlite check result, tiles per zoom, unique images,
+                  map entries pointing at missing images
+        """
+        with self._lock:
+            check = self._db.execute("PRAGMA quick_check").fetchone()[0]
+            images = self._db.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+            dangling = self._db.execute(
+                "SELECT COUNT(*) FROM map LEFT JOIN images ON images.tile_id = map.tile_id "
+                "WHERE images.tile_id IS NULL").fetchone()[0]
+        zooms = self.zoom_counts()
+        return {
+            'ok': check == 'ok' and dangling == 0 and bool(zooms),
+            'sqlite': check,
+            'zooms': zooms,
+            'tiles': sum(zooms.values()),
+            'images': images,
+            'dangling': dangling,
+        }
+
+    def import_directory(self, tiles_dir="tiles"):
+        """Pack an existing tiles/{z}/{x}/{y}.png tree into the store"""
+        count = 0
+        for zoom, x, y, path in DirectoryTileSource(tiles_dir).iter_tiles():
+            with open(path, 'rb') as f:
+                self.put_tile(zoom, x, y, f.read())
+            count += 1
+        self.commit()
+        return count
+
+    def close(self):
+        if not self.readonly:
+            self.commit()
+        self._db.close()
+
+
+class DirectoryTileSource:
+    """Reads tiles from the tiles/{z}/{x}/{y}.png layout"""
+
+    def __init__(self, tiles_dir="tiles"):
+        self.tiles_dir = tiles_dir
+
+    def tile_file(self, zoom, x, y):
+        return os.path.join(self.tiles_dir, str(zoom), str(x), f"{y}.png")
+
+    def get_tile(self, zoom, x, y):
+        try:
+            with open(self.tile_file(zoom, x, y), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def iter_tiles(self):
+        """Yield (zoom, x, y, path) for every tile file"""
+        for zoom_name in os.listdir(self.tiles_dir):
+            zoom_dir = os.path.join(self.tiles_dir, zoom_name)
+            if not zoom_name.isdigit() or not os.path.isdir(zoom_dir):
+                continue
+            for x_name in os.listdir(zoom_dir):
+                x_dir = os.path.join(zoom_dir, x_name)
+                if not x_name.isdigit() or not os.path.isdir(x_dir):
+                    continue
+                for file_name in os.listdir(x_dir):
+                    y_name, ext = os.path.splitext(file_name)
+                    if ext == '.png' and y_name.isdigit():
+                        yield int(zoom_name), int(x_name), int(y_name), os.path.join(x_dir, file_name)
+
+
+class TileCache:
+    """Byte-bounded LRU cache of tiles in front of another tile source"""
+    MISSING_COST = 128  # Bytes charged for a known-missing tile (key and entry overhead)
+
+    def __init__(self, source, max_bytes=64 * 1024 * 1024):
+        self.source = source
+        self.max_bytes = max_bytes
+        self._tiles = OrderedDict()  # (zoom, x, y) -> bytes, b'' for known-missing
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_tile(self, zoom, x, y):
+        key = (zoom, x, y)
+        with self._lock:
+            data = self._tiles.get(key)
+            if data is not None:
+                self._tiles.move_to_end(key)
+                self.hits += 1
+                return data or None
+            self.misses += 1
+        return self._load(key)
+
+    def _load(self, key):
+        data = self.source.get_tile(*key)
+        # Missing tiles are remembered too, Leaflet asks for edge tiles repeatedly
+        entry = data if data is not None else b''
+        with self._lock:
+            if key not in self._tiles and self._cost(entry) <= self.max_bytes:
+                self._tiles[key] = entry
+                self._bytes += self._cost(entry)
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._tiles.popitem(last=False)
+                    self._bytes -= self._cost(evicted)
+                    self.evictions += 1
+        return data
+
+    def _cost(self, entry):
+        """Bytes an entry counts against max_bytes; misses aren't free either"""
+        return len(entry) or self.MISSING_COST
+
+    def warm(self, lat, lon, zoom_levels, tile_radius=2):
+        """Preload the tiles around a point, without counting them as misses"""
+        for zoom in zoom_levels:
+            xtile, ytile = lat_lon_to_tile(lat, lon, zoom)
+            n = 2 ** zoom
+            for x in range(max(0, xtile - tile_radius), min(n, xtile + tile_radius + 1)):
+                for y in range(max(0, ytile - tile_radius), min(n, ytile + tile_radius + 1)):
+                    with self._lock:
+                        cached = (zoom, x, y) in self._tiles
+                    if not cached:
+                        self._load((zoom, x, y))
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Hit/miss/eviction counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'tiles': len(self._tiles),
+                'bytes': self._bytes,
+            }
+
+
+class TileManifest:
+    """
+    ETag / Last-Modified / content hash per tile for a tiles/ directory,
+    kept in tiles/manifest.json (MBTilesStore keeps the same in a table)
+    """
+
+    def __init__(self, tiles_dir="tiles"):
+        self.path = os.path.join(tiles_dir, "manifest.json")
+        self._entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self._entries = json.load(f)
+
+    def get_manifest(self, zoom, x, y):
+        entry = self._entries.get(f"{zoom}/{x}/{y}")
+        return tuple(entry[:3]) if entry else None
+
+    def update_manifest(self, zoom, x, y, etag, last_modified, tile_hash, checked_at):
+        with self._lock:
+            self._entries[f"{zoom}/{x}/{y}"] = [etag, last_modified, tile_hash, checked_at]
+
+    def hashes(self):
+        """{content_hash: (zoom, x, y)} of one tile per distinct image"""
+        result = {}
+        for key, entry in self._entries.items():
+            zoom, x, y = (int(part) for part in key.split('/'))
+            result.setdefault(entry[2], (zoom, x, y))
+        return result
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = self.path + ".part"
+            with open(temp_path, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(temp_path, self.path)
+
+
+def open_tile_source(store_path=DEFAULT_STORE, tiles_dir="tiles"):
+    """The packed store if present, otherwise the tile directory"""
+    if os.path.exists(store_path):
+        return MBTilesStore(store_path, readonly=True)
+    return DirectoryTileSource(tiles_dir)
@@ -0,0 +1,116 @@
+"""
+Incrementally simplified flight track for the map.
+
+Every position fix goes through TrackSimplifier.add(). While the drone flies
+in a straight line the newest vertex just slides forward, so a long flight
+keeps a few vertices per turn instead of one per packet. Each change is
+reported as the index of the first vertex that changed, letting the map
+update its polyline from that index instead of rebuilding it.
+"""
+import math
+
+EARTH_RADIUS = 6378137.0  # metres
+
+
+def local_xy(origin, point):
+    """Equirectangular (x, y) in metres of `point` relative to `origin`"""
+    lat0, lon0 = origin
+    lat, lon = point
+    x = math.radians(lon - lon0) * EARTH_RADIUS * math.cos(math.radians(lat0))
+    y = math.radians(lat - lat0) * EARTH_RADIUS
+    return x, y
+
+
+def distance_m(a, b):
+    x, y = local_xy(a, b)
+    return math.hypot(x, y)
+
+
+def segment_distance_m(point, start, end):
+    """Distance in metres from `point` to the segment start-end"""
+    px, py = local_xy(start, point)
+    ex, ey = local_xy(start, end)
+    length2 = ex * ex + ey * ey
+    if length2 == 0:
+        return math.hypot(px, py)
+    t = max(0.0, min(1.0, (px * ex + py * ey) / length2))
+    return math.hypot(px - t * ex, py - t * ey)
+
+
+def douglas_peucker(points, tolerance_m):
+    """Simplify a whole (lat, lon) list, keeping both end points"""
+    if len(points) < 3:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        worst, worst_index = 0.0, None
+        for index in range(first + 1, last):
+            d = segment_distance_m(points[index], points[first], points[last])
+            if d > worst:
+                worst, worst_index = d, index
+        if worst_index is not None and worst > tolerance_m:
+            keep[worst_index] = True
+            stack.append((first, worst_index))
+            stack.append((worst_index, last))
+    return [p for p, kept in zip(points, keep) if kept]
+
+
+class TrackSimplifier:
+    """Flight track whose vertices stay within tolerance_m of every fix"""
+
+    MAX_SWALLOWED = 256  # Fixes checked when sliding the last vertex
+
+    def __init__(self, tolerance_m=3.0, max_vertices=5000):
+        """
+        Args:
+            tolerance_m (float): Largest allowed offset of a dropped fix from the line
+            max_vertices (int): Re-simplify the whole track (doubling the
+                tolerance) once it grows past this
+        """
+        self.tolerance_m = tolerance_m
+        self.max_vertices = max_vertices
+        self.vertices = []
+        self.fixes = 0
+        self._swallowed = []  # Fixes dropped since vertices[-2]
+
+    def add(self, lat, lon):
+        """
+        Add a position fix
+        Returns:
+            int or None: Index of the first vertex that changed, None if the
+            track is unchanged
+        """
+        point = (float(lat), float(lon))
+        self.fixes += 1
+        vertices = self.vertices
+        if not vertices:
+            vertices.append(point)
+            return 0
+        if distance_m(vertices[-1], point) < self.tolerance_m:
+            return None  # Hovering or GPS jitter
+
+        if len(vertices) >= 2 and len(self._swallowed) < self.MAX_SWALLOWED:
+            anchor = vertices[-2]
+            candidates = self._swallowed + [vertices[-1]]
+            if all(segment_distance_m(p, anchor, point) <= self.tolerance_m
+                   for p in candidates):
+                # Still on the same line: slide the last vertex forward
+                self._swallowed.append(vertices[-1])
+                vertices[-1] = point
+                return len(vertices) - 1
+
+        self._swallowed = []
+        vertices.append(point)
+        if len(vertices) > self.max_vertices:
+            self.tolerance_m *= 2
+            self.vertices = douglas_peucker(vertices, self.tolerance_m)
+            return 0
+        return len(vertices) - 1
+
+    def clear(self):
+        self.vertices = []
+        self._swallowed = []
+        self.fixes = 0